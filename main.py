@@ -1,5 +1,7 @@
 import argparse
+import os
 import langchain
+from src.utils.batch_utils import read_manifest, run_portfolio, write_summary
 from src.utils.questions_and_report_utils import (
     generate_list_of_questions,
     build_report,
@@ -11,16 +13,40 @@ langchain.debug = True
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Process company data")
     parser.add_argument("--company", type=str, help="Name of the company")
+    parser.add_argument(
+        "--factiva",
+        type=str,
+        default="factiva/Gartner Inc Factiva Report.pdf",
+        help="Path to the Factiva report of the company",
+    )
+    parser.add_argument(
+        "--spend",
+        type=str,
+        default="SpendReport/Spend Report Gartner 2019-2023(June).xlsx",
+        help="Path to the SpendCube file",
+    )
+    parser.add_argument(
+        "--manifest",
+        type=str,
+        help="CSV file with the columns company, factiva_pdf and spend_file, "
+        "to generate the reports of many companies in one run",
+    )
+    parser.add_argument(
+        "--output-dir",
+        type=str,
+        default="reports",
+        help="Directory of the reports generated from a manifest",
+    )
 
     args = parser.parse_args()
-    if args.company:
+    if args.manifest:
+        langchain.debug = False
+        results = run_portfolio(read_manifest(args.manifest), args.output_dir)
+        write_summary(results, os.path.join(args.output_dir, "summary.csv"))
+    elif args.company:
         company_name = args.company
+        questions = generate_list_of_questions(company_name, args.factiva, args.spend)
+        build_report(questions, company_name, f"{company_name}.html")
     else:
-        print("Please provide a company name using --company")
+        print("Please provide a company name using --company, or --manifest")
         exit(1)
-
-    csv_path = "SpendReport/Spend Report Gartner 2019-2023(June).xlsx"
-    pdf_path = "factiva/Gartner Inc Factiva Report.pdf"
-    questions = generate_list_of_questions(company_name, pdf_path, csv_path)
-
-    build_report(questions, company_name, f"{company_name}.html")
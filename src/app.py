@@ -1,10 +1,11 @@
 import os
 import io
-import tempfile
 import json
+import traceback
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import FastAPI, File, Form, Query, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, StreamingResponse
 from typing import Annotated, List, Union
 from src.utils.questions_and_report_utils import (
     aggregate_spendcube_files,
@@ -12,12 +13,26 @@ from src.utils.questions_and_report_utils import (
     build_report,
     generate_list_of_questions,
     generate_small_list_of_questions,
+    iter_report_sections,
+    report_error_section,
+    report_header,
 )
 import pandas as pd
 from azure.storage.blob import BlobServiceClient
 from azure.core.exceptions import ResourceNotFoundError
-from src.utils.azure_strorage_utils import generate_random_string
+from src.utils.azure_strorage_utils import (
+    download_blob_to_buffer,
+    generate_random_string,
+)
+from src.utils.file_utils import to_named_buffer
+from src.utils.spendcube_utils import load_spendcube_blob
+from src.document_loaders.serp_loader import SerpLoader
+from src.utils.custom_errors import JobQueueFullError
+from src.utils.fetch_utils import page_cache
+from src.utils.job_utils import JobManager
+from src.utils.rate_limit_utils import rate_limits_state
 from fastapi.responses import JSONResponse
+import langchain
 
 
 json_path = os.path.join(os.getcwd(), "credentials", "credentials.json")
@@ -32,6 +47,11 @@ blob_service_client = BlobServiceClient(
 
 app = FastAPI()
 
+job_manager = JobManager()
+
+# Maximum number of SpendCube workbooks downloaded at once by a request
+SPENDCUBE_DOWNLOAD_WORKERS = int(os.getenv("SPENDCUBE_DOWNLOAD_WORKERS", "4"))
+
 CORS_ALLOWED_ORIGINS = os.getenv("CORS_ALLOWED_ORIGINS", "http://localhost:7000").split(
     ","
 )
@@ -50,6 +70,101 @@ def health():
     return "OK"
 
 
+@app.get("/cacheStats", response_class=JSONResponse)
+def cacheStats():
+    """
+    Returns the hit/miss counters and sizes of the search, page and LLM caches.
+    """
+    return JSONResponse(
+        content={
+            "serp": SerpLoader.search.stats(),
+            "pages": page_cache.stats(),
+            "llm": langchain.llm_cache.cache.stats(),
+        }
+    )
+
+
+@app.get("/rateLimits", response_class=JSONResponse)
+def rateLimits():
+    """
+    Returns the state of the rate limiter of each Azure OpenAI deployment: current
+    concurrency, calls in flight, remaining quotas and throttled calls.
+    """
+    return JSONResponse(content=rate_limits_state())
+
+
+def _read_upload(upload_file: UploadFile):
+    """
+    Reads an uploaded file into a named in-memory file.
+    """
+    return to_named_buffer(upload_file.file.read(), upload_file.filename)
+
+
+def _download_report_files(factiva_report_name, spend_report_name):
+    """
+    Downloads the Factiva and spend reports from Azure Blob Storage into memory.
+
+    Returns:
+    - Tuple[io.BytesIO, CachedSpendCube]: The Factiva report and the spend report.
+
+    Raises:
+    - ResourceNotFoundError: If one of the files is not found, with a message
+    telling which one.
+    """
+    container_client_factiva = blob_service_client.get_container_client("factiva")
+    container_client_spend_report = blob_service_client.get_container_client(
+        "spendcube-aggregated"
+    )
+    try:
+        factiva_report = download_blob_to_buffer(
+            container_client_factiva, factiva_report_name
+        )
+    except ResourceNotFoundError:
+        raise ResourceNotFoundError("The factiva file is not found on Azure")
+    try:
+        spend_report = load_spendcube_blob(
+            container_client_spend_report, spend_report_name
+        )
+    except ResourceNotFoundError:
+        raise ResourceNotFoundError("The spendcube file is not found on Azure")
+    return factiva_report, spend_report
+
+
+def _upload_report(questions, company_name, on_question_done=None):
+    """
+    Builds the HTML report in memory and uploads it on Azure Blob Storage.
+
+    Returns:
+    - str: The blob name of the uploaded report.
+    """
+    html_report = io.StringIO()
+    build_report(questions, company_name, html_report, on_question_done)
+    container_client_result = blob_service_client.get_container_client("result")
+    blob_name = (
+        f"Market_Research_{company_name}_" + generate_random_string(3) + ".html"
+    )
+    container_client_result.upload_blob(
+        name=blob_name, data=html_report.getvalue().encode("utf-8")
+    )
+    return blob_name
+
+
+def _upload_aggregated_spendcube(aggregated_spend_cube_file, blob_name):
+    """
+    Writes the aggregated spendcube into an in-memory Excel file and uploads it
+    on Azure Blob Storage.
+    """
+    aggregated_spend_report = io.BytesIO()
+    with pd.ExcelWriter(aggregated_spend_report, engine="openpyxl") as writer:
+        aggregated_spend_cube_file.to_excel(writer)
+    container_client_result = blob_service_client.get_container_client(
+        "spendcube-aggregated"
+    )
+    container_client_result.upload_blob(
+        name=blob_name, data=aggregated_spend_report.getvalue()
+    )
+
+
 @app.post("/generateReportfromLocalFiles", response_class=HTMLResponse)
 def generateReport(
     factiva_report: Annotated[UploadFile, File()],
@@ -71,24 +186,51 @@ def generateReport(
     print(f"Spend Report received : {spend_report.filename}")
     print(f"Parameter detected for brand : {company_name}")
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_pdf_file:
-        temp_pdf_file.write(factiva_report.file.read())
-        print(f"Temporary file saved at: {temp_pdf_file.name}")
-        pdf_path = temp_pdf_file.name
+    pdf_file = _read_upload(factiva_report)
+    xlsx_file = _read_upload(spend_report)
+    questions = generate_list_of_questions(company_name, pdf_file, xlsx_file)
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx") as temp_xlsx_file:
-        temp_xlsx_file.write(spend_report.file.read())
-        print(f"Temporary file saved at: {temp_xlsx_file.name}")
-        csv_path = temp_xlsx_file.name
-    questions = generate_list_of_questions(company_name, pdf_path, csv_path)
-    temp_html_file = tempfile.NamedTemporaryFile(mode="w", delete=False, suffix=".html")
+    html_report = io.StringIO()
+    build_report(questions, company_name, html_report)
+    html_content = html_report.getvalue()
 
-    build_report(questions, company_name, temp_html_file.name)
+    return HTMLResponse(content=html_content, status_code=200)
 
-    with open(temp_html_file.name, "r") as f:
-        html_content = f.read()
 
-    return HTMLResponse(content=html_content, status_code=200)
+@app.post("/streamReportfromLocalFiles", response_class=StreamingResponse)
+def streamReport(
+    factiva_report: Annotated[UploadFile, File()],
+    spend_report: Annotated[UploadFile, File()],
+    company_name: Annotated[str, Form()],
+):
+    """
+    Endpoint for generating a report based on provided files and company name,
+    streamed as chunked HTML. The report header is sent right away, then each
+    question's section as soon as it is resolved, in the order of the report.
+
+    Args:
+    - factiva_report (UploadFile): Uploaded Factiva pdf report file.
+    - spend_report (UploadFile): Uploaded spending report xlsx file.
+    - company_name (str): Name of the company.
+
+    Returns:
+    - StreamingResponse: HTML content of the generated report.
+    """
+    pdf_file = _read_upload(factiva_report)
+    xlsx_file = _read_upload(spend_report)
+
+    def stream_report():
+        yield report_header(company_name)
+        # The status code is already sent, a failure ends the report with an error
+        try:
+            questions = generate_list_of_questions(company_name, pdf_file, xlsx_file)
+            for _, html, _ in iter_report_sections(questions):
+                yield html
+        except Exception as e:
+            traceback.print_exc()
+            yield report_error_section(e)
+
+    return StreamingResponse(stream_report(), media_type="text/html")
 
 
 @app.post(
@@ -103,11 +245,22 @@ def aggregateSpendcubefilesandReturnvendorsEntities(
     container_client_spend_report = blob_service_client.get_container_client(
         "spendcube"
     )
-    spend_cube_paths = []
-    for year in range(start_year, end_year + 1):
+    years = list(range(start_year, end_year + 1))
+    with ThreadPoolExecutor(
+        max_workers=max(min(len(years), SPENDCUBE_DOWNLOAD_WORKERS), 1)
+    ) as executor:
+        downloads = [
+            executor.submit(
+                load_spendcube_blob,
+                container_client_spend_report,
+                f"{year}_SpendCube_Randomised_DATA.xlsm",
+            )
+            for year in years
+        ]
+    spend_cube_files = []
+    for year, download in zip(years, downloads):
         try:
-            blob_name = f"{year}_SpendCube_Randomised_DATA.xlsm"
-            spend_report = container_client_spend_report.download_blob(blob_name)
+            spend_cube_files.append(download.result())
         except ResourceNotFoundError:
             return JSONResponse(
                 content={
@@ -115,75 +268,36 @@ def aggregateSpendcubefilesandReturnvendorsEntities(
                     "status": "error",
                 }
             )
-        with tempfile.NamedTemporaryFile(
-            delete=False, suffix=".xlsx"
-        ) as temp_xlsx_file:
-            temp_xlsx_file.write(io.BytesIO(spend_report.readall()).getvalue())
-            print(f"Temporary file saved at: {temp_xlsx_file.name}")
-            csv_path = temp_xlsx_file.name
-            spend_cube_paths.append(csv_path)
-    container_client_result = blob_service_client.get_container_client(
-        "spendcube-aggregated"
-    )
+    suggestions = []
     if entities_of_interest is None:
         (
             aggregated_spend_cube_file,
             entities_of_interest,
+            suggestions,
         ) = aggregate_spendcube_files_and_get_all_vendors_names(
-            spend_cube_paths, company_name
-        )
-        temp_aggregated_spend_report = tempfile.NamedTemporaryFile(
-            mode="w", delete=False, suffix=".xlsx"
-        )
-        with pd.ExcelWriter(
-            temp_aggregated_spend_report.name, engine="openpyxl"
-        ) as writer:
-            aggregated_spend_cube_file.to_excel(writer)
-        with open(temp_aggregated_spend_report.name, "rb") as data:
-            blob_name = (
-                f"Spendcube_aggregated_{company_name}_{start_year}_{end_year}_"
-                + generate_random_string(3)
-                + ".xlsx"
-            )
-            container_client_result.upload_blob(name=blob_name, data=data)
-
-        return JSONResponse(
-            content={
-                "response": f"The spendcube file is aggregated and uploaded on Azure Storage with name: {blob_name}."
-                + f"The different vendors involved are: {entities_of_interest}",
-                "filename": blob_name,
-                "status": "ok",
-            }
+            spend_cube_files, company_name
         )
-
     else:
         aggregated_spend_cube_file = aggregate_spendcube_files(
-            spend_cube_paths, entities_of_interest
-        )
-        temp_aggregated_spend_report = tempfile.NamedTemporaryFile(
-            mode="w", delete=False, suffix=".xlsx"
+            spend_cube_files, entities_of_interest
         )
-        with pd.ExcelWriter(
-            temp_aggregated_spend_report.name, engine="openpyxl"
-        ) as writer:
-            aggregated_spend_cube_file.to_excel(writer)
-
-        with open(temp_aggregated_spend_report.name, "rb") as data:
-            blob_name = (
-                f"Spendcube_aggregated_{company_name}_{start_year}_{end_year}_"
-                + generate_random_string(3)
-                + ".xlsx"
-            )
-            container_client_result.upload_blob(name=blob_name, data=data)
 
-        return JSONResponse(
-            content={
-                "response": f"The spendcube file is aggregated and uploaded on Azure Storage with name: {blob_name}."
-                + f"The different vendors involved are: {entities_of_interest}",
-                "filename": blob_name,
-                "status": "ok",
-            }
-        )
+    blob_name = (
+        f"Spendcube_aggregated_{company_name}_{start_year}_{end_year}_"
+        + generate_random_string(3)
+        + ".xlsx"
+    )
+    _upload_aggregated_spendcube(aggregated_spend_cube_file, blob_name)
+
+    return JSONResponse(
+        content={
+            "response": f"The spendcube file is aggregated and uploaded on Azure Storage with name: {blob_name}."
+            + f"The different vendors involved are: {entities_of_interest}",
+            "filename": blob_name,
+            "suggestions": suggestions,
+            "status": "ok",
+        }
+    )
 
 
 @app.post("/generateReportfromAzure", response_class=JSONResponse)
@@ -207,66 +321,161 @@ def generateReportAzure(
     associated with a specific company. It reads the reports from Azure Blob Storage, processes them,
     generates a list of questions, builds an HTML report, and uploads the generated report to Azure Blob Storage.
     """
-    container_client_factiva = blob_service_client.get_container_client("factiva")
-    container_client_spend_report = blob_service_client.get_container_client(
-        "spendcube-aggregated"
-    )
     try:
-        factiva_report = container_client_factiva.download_blob(factiva_report_name)
-    except ResourceNotFoundError:
-        return JSONResponse(
-            content={
-                "response": "The factiva file is not found on Azure",
-                "status": "error",
-            }
+        factiva_report, spend_report = _download_report_files(
+            factiva_report_name, spend_report_name
         )
-    try:
-        spend_report = container_client_spend_report.download_blob(spend_report_name)
-    except ResourceNotFoundError:
+    except ResourceNotFoundError as e:
         return JSONResponse(
             content={
-                "response": "The spendcube file is not found on Azure",
+                "response": e.message,
                 "status": "error",
             }
         )
 
-    with tempfile.NamedTemporaryFile(
-        delete=False, prefix="FactivaReport_", suffix=".pdf"
-    ) as temp_pdf_file:
-        temp_pdf_file.write(io.BytesIO(factiva_report.readall()).getvalue())
-        print(f"Temporary file saved at: {temp_pdf_file.name}")
-        pdf_path = temp_pdf_file.name
+    questions = generate_list_of_questions(company_name, factiva_report, spend_report)
+    blob_name = _upload_report(questions, company_name)
+
+    return JSONResponse(
+        content={
+            "response": f"The market research is generated and uploaded on Azure Storage with blob name: {blob_name}",
+            "filename": blob_name,
+            "status": "ok",
+        }
+    )
 
-    with tempfile.NamedTemporaryFile(
-        delete=False, prefix="SpendReport_", suffix=".xlsx"
-    ) as temp_xlsx_file:
-        temp_xlsx_file.write(io.BytesIO(spend_report.readall()).getvalue())
-        print(f"Temporary file saved at: {temp_xlsx_file.name}")
-        csv_path = temp_xlsx_file.name
 
-    questions = generate_list_of_questions(company_name, pdf_path, csv_path)
+def _generate_report_from_azure(
+    job, factiva_report_name, spend_report_name, company_name
+):
+    """
+    Generates a market research report from Azure Blob Storage files and uploads
+    it on Azure Blob Storage, reporting the progress of each question on the job.
 
-    temp_html_report = tempfile.NamedTemporaryFile(
-        mode="w", delete=False, suffix=".html"
+    Returns:
+    - str: The blob name of the uploaded report.
+    """
+    factiva_report, spend_report = _download_report_files(
+        factiva_report_name, spend_report_name
+    )
+    questions = generate_list_of_questions(company_name, factiva_report, spend_report)
+    job.set_questions(questions)
+    return _upload_report(questions, company_name, job.on_question_done)
+
+
+@app.post("/jobs/generateReportfromAzure", response_class=JSONResponse)
+def submitReportJobAzure(
+    factiva_report_name: Annotated[str, Form()],
+    spend_report_name: Annotated[str, Form()],
+    company_name: Annotated[str, Form()],
+):
+    """
+    Queue the generation of a market research report from Azure Blob Storage files.
+
+    Parameters:
+    - `factiva_report_name`: Name of the Factiva report.
+    - `spend_report_name`: Name of the spend report.
+    - `company_name`: Name of the company for market research.
+
+    Returns:
+    - `JSONResponse`: Response containing the id of the job, to be polled on
+    `/jobs/{job_id}`. When too many jobs are already waiting, the job is refused
+    with a 503 status code.
+    """
+    return _submit_report_job(
+        company_name,
+        lambda job: _generate_report_from_azure(
+            job, factiva_report_name, spend_report_name, company_name
+        ),
+    )
+
+
+def _generate_report_from_files(job, pdf_file, xlsx_file, company_name):
+    """
+    Generates a market research report from uploaded files and uploads it on
+    Azure Blob Storage, reporting the progress of each question on the job.
+
+    Returns:
+    - str: The blob name of the uploaded report.
+    """
+    questions = generate_list_of_questions(company_name, pdf_file, xlsx_file)
+    job.set_questions(questions)
+    return _upload_report(questions, company_name, job.on_question_done)
+
+
+@app.post("/jobs/generateReportfromLocalFiles", response_class=JSONResponse)
+def submitReportJobLocalFiles(
+    factiva_report: Annotated[UploadFile, File()],
+    spend_report: Annotated[UploadFile, File()],
+    company_name: Annotated[str, Form()],
+):
+    """
+    Queue the generation of a market research report from uploaded files. The
+    report is uploaded on Azure Blob Storage once generated.
+
+    Parameters:
+    - `factiva_report`: Uploaded Factiva pdf report file.
+    - `spend_report`: Uploaded spending report xlsx file.
+    - `company_name`: Name of the company for market research.
+
+    Returns:
+    - `JSONResponse`: Response containing the id of the job, to be polled on
+    `/jobs/{job_id}`. When too many jobs are already waiting, the job is refused
+    with a 503 status code.
+    """
+    # The uploads are closed once the request is answered, they are read first
+    pdf_file = _read_upload(factiva_report)
+    xlsx_file = _read_upload(spend_report)
+    return _submit_report_job(
+        company_name,
+        lambda job: _generate_report_from_files(job, pdf_file, xlsx_file, company_name),
     )
-    build_report(questions, company_name, temp_html_report.name)
-    container_client_result = blob_service_client.get_container_client("result")
 
-    with open(temp_html_report.name, "rb") as data:
-        blob_name = (
-            f"Market_Research_{company_name}_" + generate_random_string(3) + ".html"
+
+def _submit_report_job(company_name, run):
+    """
+    Queues a report generation job.
+
+    Returns:
+    - JSONResponse: The id of the job, or a 503 error if the queue is full.
+    """
+    try:
+        job = job_manager.submit(company_name, run)
+    except JobQueueFullError as e:
+        return JSONResponse(
+            content={"response": e.message, "status": "error"}, status_code=503
         )
-        container_client_result.upload_blob(name=blob_name, data=data)
 
     return JSONResponse(
         content={
-            "response": f"The market research is generated and uploaded on Azure Storage with blob name: {blob_name}",
-            "filename": blob_name,
+            "response": f"The market research on {company_name} is queued with job id: {job.id}",
+            "job_id": job.id,
             "status": "ok",
         }
     )
 
 
+@app.get("/jobs/{job_id}", response_class=JSONResponse)
+def getReportJob(job_id: str):
+    """
+    Get the status of a report generation job.
+
+    Parameters:
+    - `job_id`: Id of the job.
+
+    Returns:
+    - `JSONResponse`: The status of the job ("queued", "running", "done" or "error"),
+    the progress of each question, and the blob name of the report once done.
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        return JSONResponse(
+            content={"response": f"Unknown job {job_id}", "status": "error"},
+            status_code=404,
+        )
+    return JSONResponse(content=job.to_dict())
+
+
 @app.post("/generateSmallreportFromazure", response_class=HTMLResponse)
 def generateSmallreportAzure(
     factiva_report_name: Annotated[str, Form()],
@@ -288,56 +497,22 @@ def generateSmallreportAzure(
     associated with a specific company. It reads the reports from Azure Blob Storage, processes them,
     generates a list of questions, builds an HTML report, and uploads the generated report to Azure Blob Storage.
     """
-    container_client_factiva = blob_service_client.get_container_client("factiva")
-    container_client_spend_report = blob_service_client.get_container_client(
-        "spendcube-aggregated"
-    )
     try:
-        factiva_report = container_client_factiva.download_blob(factiva_report_name)
-    except ResourceNotFoundError:
-        return JSONResponse(
-            content={
-                "response": "The factiva file is not found on Azure",
-                "status": "error",
-            }
+        factiva_report, spend_report = _download_report_files(
+            factiva_report_name, spend_report_name
         )
-    try:
-        spend_report = container_client_spend_report.download_blob(spend_report_name)
-    except ResourceNotFoundError:
+    except ResourceNotFoundError as e:
         return JSONResponse(
             content={
-                "response": "The spendcube file is not found on Azure",
+                "response": e.message,
                 "status": "error",
             }
         )
 
-    with tempfile.NamedTemporaryFile(
-        delete=False, prefix="FactivaReport_", suffix=".pdf"
-    ) as temp_pdf_file:
-        temp_pdf_file.write(io.BytesIO(factiva_report.readall()).getvalue())
-        print(f"Temporary file saved at: {temp_pdf_file.name}")
-        pdf_path = temp_pdf_file.name
-
-    with tempfile.NamedTemporaryFile(
-        delete=False, prefix="SpendReport_", suffix=".xlsx"
-    ) as temp_xlsx_file:
-        temp_xlsx_file.write(io.BytesIO(spend_report.readall()).getvalue())
-        print(f"Temporary file saved at: {temp_xlsx_file.name}")
-        csv_path = temp_xlsx_file.name
-
-    questions = generate_small_list_of_questions(company_name, pdf_path, csv_path)
-
-    temp_html_report = tempfile.NamedTemporaryFile(
-        mode="w", delete=False, suffix=".html"
+    questions = generate_small_list_of_questions(
+        company_name, factiva_report, spend_report
     )
-    build_report(questions, company_name, temp_html_report.name)
-    container_client_result = blob_service_client.get_container_client("result")
-
-    with open(temp_html_report.name, "rb") as data:
-        blob_name = (
-            f"Market_Research_{company_name}_" + generate_random_string(3) + ".html"
-        )
-        container_client_result.upload_blob(name=blob_name, data=data)
+    blob_name = _upload_report(questions, company_name)
 
     return JSONResponse(
         content={
@@ -1,26 +1,76 @@
+import copy
+import threading
 from abc import ABC, abstractmethod
-from typing import List
+from typing import Hashable, List, Optional
 from langchain.schema import Document
+from src.document_loaders.configured_retriever import (
+    ConfiguredRetriever,
+    RetrievalConfig,
+)
+from src.utils.concurrency_utils import SingleFlight
 from src.utils.llm_utils import create_embedding
 
 
 class AbstractLoader(ABC):
     embedder = create_embedding()
-    _retriever = None
+    # Whether the splits carry their "section" in metadata, see RetrievalConfig
+    sectioned = False
+    _index_builds = SingleFlight()
 
-    def get_retriever(self):
+    def __init__(self):
+        self._index = None
+        self._index_lock = threading.Lock()
+
+    def get_index(self):
+        """
+        Returns the index of the loader, built on first call.
+
+        The index is built once per loader even when several questions ask
+        for it at the same time, and loaders sharing the same index key share
+        a single index build.
+
+        Returns:
+        - FAISS index: The index of pages.
+        """
+        with self._index_lock:
+            if self._index is None:
+                self._index = self._index_builds.do(
+                    self._index_key(), self._build_index
+                )
+        return self._index
+
+    def get_retriever(self, config: Optional[RetrievalConfig] = None):
         """
         Retrieval:
         Builds a retriever that will be used in the Question Answering model
-        in order to find relevant splits of document relative to each type of question
+        in order to find relevant splits of document relative to each type of question.
+
+        Args:
+        - config (RetrievalConfig, optional): The sections searched, number of
+        splits, token budget, MMR and score threshold of the retrieval. Loaders
+        without sections (e.g. web pages) search their whole index.
+        Defaults to the 4 most similar splits of the whole index.
 
         Returns:
         - Retriever object: The retriever object.
         """
-        if self._retriever is None:
-            index = self._build_index()
-            self._retriever = index.as_retriever()
-        return self._retriever
+        index = self.get_index()
+        if config is None:
+            return index.as_retriever()
+        if config.sections and not self.sectioned:
+            config = copy.copy(config)
+            config.sections = None
+        return ConfiguredRetriever(vectorstore=index, config=config)
+
+    def _index_key(self) -> Hashable:
+        """
+        Identifies the documents indexed by this loader. Concurrent index builds
+        with the same key are performed only once.
+
+        Returns:
+        - Hashable: The key of the index.
+        """
+        return id(self)
 
     @abstractmethod
     def _build_index(self):
@@ -0,0 +1,122 @@
+from typing import List, Optional
+import numpy as np
+from langchain.callbacks.manager import CallbackManagerForRetrieverRun
+from langchain.schema import BaseRetriever, Document
+from langchain.vectorstores import FAISS
+from langchain.vectorstores.utils import maximal_marginal_relevance
+from src.utils.rate_limit_utils import estimate_tokens
+
+
+class RetrievalConfig:
+    """
+    How a question retrieves the splits it sends to the Language Model.
+    """
+
+    def __init__(
+        self,
+        sections: Optional[List[str]] = None,
+        k: int = 4,
+        max_tokens: Optional[int] = None,
+        mmr: bool = False,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        score_threshold: Optional[float] = None,
+    ):
+        """
+        Initializes a RetrievalConfig object.
+
+        Args:
+        - sections (List[str], optional): Only search the splits of these sections
+        (see FactivaSectionSplitter). The whole index is searched if none of its
+        splits belongs to these sections, and by loaders without sections.
+        - k (int): The maximum number of splits retrieved.
+        - max_tokens (int, optional): The maximum number of tokens of the retrieved
+        splits. The most relevant split is always kept.
+        - mmr (bool): Whether to select the splits by maximal marginal relevance,
+        to avoid near-duplicate splits.
+        - fetch_k (int): The number of candidate splits for the MMR selection.
+        - lambda_mult (float): The MMR trade-off between relevance (1) and
+        diversity (0).
+        - score_threshold (float, optional): The minimum cosine similarity between
+        the question and a split.
+        """
+        self.sections = sections
+        self.k = k
+        self.max_tokens = max_tokens
+        self.mmr = mmr
+        self.fetch_k = fetch_k
+        self.lambda_mult = lambda_mult
+        self.score_threshold = score_threshold
+
+
+class ConfiguredRetriever(BaseRetriever):
+    """
+    Retriever of a FAISS index following a RetrievalConfig. The splits are
+    filtered by section before the vector search, which is an exact search over
+    their vectors.
+    """
+
+    vectorstore: FAISS
+    config: RetrievalConfig
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _get_positions(self) -> List[int]:
+        positions = list(self.vectorstore.index_to_docstore_id)
+        if not self.config.sections:
+            return positions
+        docstore = self.vectorstore.docstore
+        in_sections = [
+            position
+            for position in positions
+            if docstore.search(self.vectorstore.index_to_docstore_id[position])
+            .metadata.get("section")
+            in self.config.sections
+        ]
+        return in_sections or positions
+
+    def _get_document(self, position) -> Document:
+        return self.vectorstore.docstore.search(
+            self.vectorstore.index_to_docstore_id[position]
+        )
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        config = self.config
+        positions = self._get_positions()
+        if not positions:
+            return []
+
+        index = self.vectorstore.index
+        vectors = index.reconstruct_n(0, index.ntotal)[positions]
+        query_vector = np.array(
+            self.vectorstore.embedding_function(query), dtype=np.float32
+        )
+        norms = np.linalg.norm(vectors, axis=1) * np.linalg.norm(query_vector)
+        similarities = vectors @ query_vector / np.maximum(norms, 1e-12)
+
+        ranked = np.argsort(-similarities)
+        if config.score_threshold is not None:
+            ranked = ranked[similarities[ranked] >= config.score_threshold]
+        if config.mmr:
+            candidates = ranked[: config.fetch_k]
+            selected = maximal_marginal_relevance(
+                query_vector,
+                vectors[candidates],
+                k=min(config.k, len(candidates)),
+                lambda_mult=config.lambda_mult,
+            )
+            ranked = candidates[selected]
+        documents = [self._get_document(positions[i]) for i in ranked[: config.k]]
+
+        if config.max_tokens is None:
+            return documents
+        kept, tokens = [], 0
+        for document in documents:
+            tokens += estimate_tokens(document.page_content)
+            if kept and tokens > config.max_tokens:
+                break
+            kept.append(document)
+        return kept
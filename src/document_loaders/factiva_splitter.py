@@ -0,0 +1,113 @@
+import re
+from typing import List
+from langchain.schema import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+
+# Headings of the sections of the Factiva company reports
+FACTIVA_SECTIONS = [
+    "Company Overview",
+    "Business Description",
+    "Key Information",
+    "Key Executives",
+    "Management Team",
+    "Board of Directors",
+    "Peer Comparison",
+    "Competitors",
+    "Key Financials",
+    "Financial Ratios",
+    "Annual Income Statement",
+    "Annual Balance Sheet",
+    "Annual Cash Flow",
+    "Interim Income Statement",
+    "Interim Balance Sheet",
+    "Corporate Family",
+    "Subsidiaries",
+    "Locations",
+    "Industry Classification",
+    "Significant Developments",
+    "Recent News",
+]
+# Section of the text found before the first known heading
+DEFAULT_SECTION = "Other"
+
+_SECTIONS_BY_NAME = {section.lower(): section for section in FACTIVA_SECTIONS}
+HEADING_PATTERN = re.compile(
+    r"^\s*("
+    + "|".join(r"\s+".join(map(re.escape, s.split())) for s in FACTIVA_SECTIONS)
+    + r")\s*:?\s*$",
+    re.IGNORECASE,
+)
+# Page headers and footers repeated on every page
+PAGE_FURNITURE_PATTERN = re.compile(
+    r"^\s*(Page\s+\d+\s+of\s+\d+|©.*Factiva.*)\s*$", re.IGNORECASE
+)
+
+
+class FactivaSectionSplitter:
+    """
+    Splits the pages of a Factiva report into chunks that never span two sections.
+    Each chunk carries its section heading in metadata ("section"), and the chunks
+    after the first one of a section start with the heading again. Long sections
+    are split on blank lines, then lines, so that table rows stay whole.
+    """
+
+    def __init__(self, chunk_size=4000, chunk_overlap=200):
+        """
+        Initializes a FactivaSectionSplitter object.
+
+        Args:
+        - chunk_size (int): The maximum number of characters of a chunk.
+        - chunk_overlap (int): The number of characters shared by consecutive
+        chunks of a long section.
+        """
+        self._splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            separators=["\n\n", "\n", " ", ""],
+        )
+
+    def _iter_sections(self, pages: List[Document]):
+        # body_start skips the heading line, so that the headings listed in a
+        # table of contents do not make sections of their own
+        section, page, lines, body_start = DEFAULT_SECTION, None, [], 0
+        for document in pages:
+            for line in document.page_content.splitlines():
+                if PAGE_FURNITURE_PATTERN.match(line):
+                    continue
+                heading = HEADING_PATTERN.match(line)
+                if heading is not None:
+                    if "".join(lines[body_start:]).strip():
+                        yield section, page, "\n".join(lines)
+                    name = " ".join(heading.group(1).split()).lower()
+                    section, page, lines = _SECTIONS_BY_NAME[name], None, []
+                    body_start = 1
+                if page is None:
+                    page = document.metadata.get("page")
+                lines.append(line)
+        if "".join(lines[body_start:]).strip():
+            yield section, page, "\n".join(lines)
+
+    def split_documents(self, pages: List[Document]) -> List[Document]:
+        """
+        Splits the pages of a Factiva report by section.
+
+        Args:
+        - pages (List[Document]): The pages, in order, with their "page" number
+        in metadata.
+
+        Returns:
+        - List[Document]: The chunks, with their "section" and the "page" where
+        their section starts in metadata.
+        """
+        chunks = []
+        for section, page, text in self._iter_sections(pages):
+            for number, chunk in enumerate(self._splitter.split_text(text)):
+                if number > 0 and section != DEFAULT_SECTION:
+                    chunk = f"{section}\n{chunk}"
+                chunks.append(
+                    Document(
+                        page_content=chunk, metadata={"page": page, "section": section}
+                    )
+                )
+        return chunks
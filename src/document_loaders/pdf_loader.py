@@ -1,28 +1,101 @@
-from langchain.document_loaders import PyPDFLoader
 from langchain.vectorstores import FAISS
 from src.document_loaders.abstract_loader import AbstractLoader
+from src.document_loaders.factiva_splitter import FactivaSectionSplitter
+from src.utils.cache_utils import hash_file, hash_text
+from src.utils.index_store import FaissIndexStore
+from src.utils.pdf_utils import load_pdf_chunks, load_pdf_pages
+
+# Bump when the way PDF documents are split or indexed changes,
+# so that previously saved indexes are not reused.
+INDEX_VERSION = "3"
 
 
 class PdfLoader(AbstractLoader):
+    index_store = FaissIndexStore()
+    sectioned = True
+
     def __init__(self, pdf_paths):
         """
-        Initializes a PdfLoader object with specified PDF file paths.
+        Initializes a PdfLoader object with specified PDF files.
 
         Args:
-        - pdf_paths (list): List of paths to PDF documents.
+        - pdf_paths (list): List of paths to PDF documents, or of named in-memory
+        PDF files (io.BytesIO with a `name`, see to_named_buffer).
         """
+        super().__init__()
         self.paths = pdf_paths
 
-    def get_retriever(self):
-        return super().get_retriever()
+    def get_retriever(self, config=None):
+        return super().get_retriever(config)
+
+    def get_text(self):
+        """
+        Returns the text layer of the PDF documents, page after page.
+
+        Returns:
+        - str: The text of all the pages.
+        """
+        return "\n".join(text for path in self.paths for text in load_pdf_pages(path))
+
+    def _index_key(self):
+        return ("pdf", tuple(self.paths))
 
     def _build_index(self):
-        pages = self._build_pages()
-        return FAISS.from_documents(pages, self.embedder)
-
-    def _build_pages(self):
-        pages = []
-        for path in self.paths:
-            loader = PyPDFLoader(path)
-            pages.extend(loader.load_and_split())
-        return pages
+        file_hashes = [hash_file(path) for path in self.paths]
+        index = self.index_store.load_or_build(
+            self._content_key(file_hashes),
+            self.embedder,
+            lambda: FAISS.from_documents(self._build_pages(file_hashes), self.embedder),
+        )
+        self._relabel_sources(index, file_hashes)
+        return index
+
+    def _content_key(self, file_hashes):
+        """
+        Builds the key of the saved index from the content of the PDF documents,
+        so that the same document is only indexed once whatever its path.
+
+        Args:
+        - file_hashes (List[str]): The content hashes of the PDF documents.
+
+        Returns:
+        - str: The key of the index.
+        """
+        return hash_text(
+            " ".join([INDEX_VERSION, self.embedder.model_name] + file_hashes)
+        )
+
+    def _relabel_sources(self, index, file_hashes):
+        """
+        Points the sources of a reused index to the paths of the current documents,
+        as the saved index may have been built from copies stored elsewhere.
+
+        Args:
+        - index (FAISS): The index.
+        - file_hashes (List[str]): The content hashes of the PDF documents.
+        """
+        paths_by_hash = dict(
+            zip(file_hashes, [self._source_name(path) for path in self.paths])
+        )
+        for document in index.docstore._dict.values():
+            content_hash = document.metadata.get("content_hash")
+            if content_hash in paths_by_hash:
+                document.metadata["source"] = paths_by_hash[content_hash]
+
+    @staticmethod
+    def _source_name(path):
+        return path if isinstance(path, str) else path.name
+
+    def _build_pages(self, file_hashes):
+        chunks = []
+        for path, content_hash in zip(self.paths, file_hashes):
+            chunks.extend(
+                load_pdf_chunks(
+                    path,
+                    self._source_name(path),
+                    FactivaSectionSplitter().split_documents,
+                    INDEX_VERSION,
+                    content_hash,
+                )
+            )
+        return chunks
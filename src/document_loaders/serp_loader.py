@@ -1,5 +1,6 @@
 from langchain.vectorstores import FAISS
-from langchain.document_loaders import SeleniumURLLoader
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from src.utils.fetch_utils import fetch_documents
 from src.utils.serp_utils import create_search
 from src.document_loaders.abstract_loader import AbstractLoader
 
@@ -14,10 +15,14 @@ class SerpLoader(AbstractLoader):
         Args:
         - serp_prompts (list): List of prompts for search engine queries.
         """
+        super().__init__()
         self.serp_prompts = serp_prompts
 
-    def get_retriever(self):
-        return super().get_retriever()
+    def get_retriever(self, config=None):
+        return super().get_retriever(config)
+
+    def _index_key(self):
+        return ("serp", tuple(self.serp_prompts))
 
     def _build_index(self):
         pages = self._build_pages()
@@ -25,7 +30,8 @@ class SerpLoader(AbstractLoader):
 
     def _build_pages(self):
         urls = self._get_urls()
-        return SeleniumURLLoader(urls=self._filter_non_pdf_urls(urls)).load_and_split()
+        documents = fetch_documents(self._filter_non_pdf_urls(urls))
+        return RecursiveCharacterTextSplitter().split_documents(documents)
 
     def _get_urls(self):
         url_list = []
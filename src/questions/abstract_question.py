@@ -1,11 +1,12 @@
 from abc import ABC, abstractmethod
-from typing import List
+from typing import List, Optional
 from langchain.chains import RetrievalQAWithSourcesChain
 from langchain.prompts import PromptTemplate
 from src.utils.custom_prompt import combine_prompt_template_test
 import json
 import re
 from src.document_loaders.abstract_loader import AbstractLoader
+from src.document_loaders.configured_retriever import RetrievalConfig
 from src.utils.llm_utils import create_llm, create_llm_gpt4
 
 
@@ -27,7 +28,8 @@ class QuestionWithLLM(AbstractQuestion):
         prompt: str,
         loader: AbstractLoader,
         llm_model: str,
-        backup_loaders: List[AbstractLoader] = [],
+        backup_loaders: Optional[List[AbstractLoader]] = None,
+        retrieval_config: Optional[RetrievalConfig] = None,
     ):
         """
         Initializes a QuestionWithLLM object.
@@ -38,13 +40,19 @@ class QuestionWithLLM(AbstractQuestion):
         - loader (AbstractLoader): The loader object for data retrieval.
         - llm_model (str): The type of Language Model for question answering (gpt3.5 or gpt4).
         - backup_loaders (List[AbstractLoader], optional): Backup loaders if
-        primary pdf loader fails. Defaults to an empty list.
+        primary pdf loader fails. Defaults to no backup loader.
+        - retrieval_config (RetrievalConfig, optional): How the splits sent to the
+        Language Model are retrieved, from the loader and the backup loaders.
+        Defaults to the 4 most similar splits.
         """
         self.prompt = prompt
         self.title = title
         self.loader = loader
         self.llm_model = llm_model
-        self.backup_loaders = backup_loaders
+        self.backup_loaders = list(backup_loaders or [])
+        self.retrieval_config = retrieval_config
+        # QuestionBatch answering this question along others, see question_batch
+        self.batch = None
         self._qa = None
         self._answer = None
         self._answer_json = None
@@ -97,13 +105,17 @@ class QuestionWithLLM(AbstractQuestion):
     @property
     def answer(self):
         """
-        Retrieves the answer in string format.
+        Retrieves the answer in string format. While the question uses the loader of
+        its batch, the answer comes from the batch if it answered the question.
 
         Returns:
         - str: The answer in string format.
         """
         if self._answer is None:
-            self._answer = json.dumps(self.qa(self.prompt))
+            if self.batch is not None and self.loader is self.batch.loader:
+                self._answer = self.batch.get_answer(self)
+            if self._answer is None:
+                self._answer = json.dumps(self.qa(self.prompt))
         return self._answer
 
     @property
@@ -118,6 +130,39 @@ class QuestionWithLLM(AbstractQuestion):
             self._answer_json = json.loads(self.answer)
         return self._answer_json
 
+    def _parse_answer(self, answer: str):
+        """
+        Parses the text of an answer into the value used by the question. Questions
+        expecting a structured answer override it.
+
+        Args:
+        - answer (str): The text of the answer.
+
+        Returns:
+        - The parsed answer, the text itself by default.
+
+        Raises:
+        - ValueError: If the answer cannot be parsed.
+        """
+        return answer
+
+    def _is_valid_answer(self, answer: str) -> bool:
+        """
+        Checks whether an answer obtained outside of the question, e.g. from a
+        QuestionBatch, can be parsed by the question.
+
+        Args:
+        - answer (str): The text of the answer.
+
+        Returns:
+        - bool: True if the answer can be parsed, False otherwise.
+        """
+        try:
+            self._parse_answer(answer)
+        except (ValueError, TypeError):
+            return False
+        return True
+
     def _check_answer(self):
         """
         Checks whether the question-answering model found a relevant response.
@@ -185,7 +230,7 @@ class QuestionWithLLM(AbstractQuestion):
         """
         return RetrievalQAWithSourcesChain.from_chain_type(
             self._select_llm(),
-            retriever=self.loader.get_retriever(),
+            retriever=self.loader.get_retriever(self.retrieval_config),
             chain_type="stuff",
             chain_type_kwargs={
                 "prompt": PromptTemplate(
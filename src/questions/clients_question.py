@@ -1,19 +1,28 @@
+from src.document_loaders.configured_retriever import RetrievalConfig
 from src.document_loaders.serp_loader import SerpLoader
 from src.questions.abstract_question import QuestionWithLLM
 
 
 class ClientsQuestion(QuestionWithLLM):
-    def __init__(self, company_name, loader, backup_loaders=[]):
+    def __init__(self, company_name, loader, backup_loaders=None):
         title = f"Who are {company_name} clients? "
         prompt = f"""
         What types of individuals and organizations are included among the {company_name}'s clients?
         Give some example of {company_name}'s clients.
         """
         llm_model = "gpt4"
-        if backup_loaders == []:
-            backup_loaders.append(self._build_serp_loader(company_name))
+        retrieval_config = RetrievalConfig(mmr=True)
+        if backup_loaders is None:
+            backup_loaders = [self._build_serp_loader(company_name)]
 
-        super().__init__(title, prompt, loader, llm_model, backup_loaders)
+        super().__init__(
+            title,
+            prompt,
+            loader,
+            llm_model,
+            backup_loaders,
+            retrieval_config=retrieval_config,
+        )
 
     def _build_serp_loader(self, company_name):
         serp_prompts = [
@@ -1,19 +1,30 @@
+from src.document_loaders.configured_retriever import RetrievalConfig
 from src.document_loaders.serp_loader import SerpLoader
 from src.questions.abstract_question import QuestionWithLLM
 
 
 class CompetitorsQuestion(QuestionWithLLM):
-    def __init__(self, company_name, loader, backup_loaders=[]):
+    def __init__(self, company_name, loader, backup_loaders=None):
         title = f"Who are the competitors of {company_name}?"
         prompt = f"""
         Please extract the competitors of {company_name} mentionned in the Peer Comparison
         table with their respective sales.
         """
         llm_model = "gpt4"
-        if backup_loaders == []:
-            backup_loaders.append(self._build_serp_loader(company_name))
+        retrieval_config = RetrievalConfig(
+            sections=["Peer Comparison", "Competitors"], k=2
+        )
+        if backup_loaders is None:
+            backup_loaders = [self._build_serp_loader(company_name)]
 
-        super().__init__(title, prompt, loader, llm_model, backup_loaders)
+        super().__init__(
+            title,
+            prompt,
+            loader,
+            llm_model,
+            backup_loaders,
+            retrieval_config=retrieval_config,
+        )
 
     def _build_serp_loader(self, company_name):
         serp_prompts = [f"{company_name} main competitors"]
@@ -0,0 +1,120 @@
+import re
+from typing import Dict, List, Optional
+
+
+# Number of lines after a table heading searched for the rows of the table
+MAX_TABLE_LINES = 80
+
+# Headings of the financial tables, each one ending the previous table
+TABLE_HEADING_PATTERN = re.compile(
+    r"^\s*(Annual|Interim|Quarterly)\s+"
+    r"(Income\s+Statement|Balance\s+Sheet|Cash\s+Flow)",
+    re.IGNORECASE,
+)
+YEAR_PATTERN = re.compile(r"\b(?:19|20)\d{2}\b")
+VALUE_PATTERN = r"\(?-?(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?\)?"
+SCALE_PATTERN = re.compile(r"\b(thousand|million|billion)s?\b", re.IGNORECASE)
+CURRENCY_CODE_PATTERN = re.compile(
+    r"\b(USD|EUR|GBP|CHF|JPY|CNY|CAD|AUD|SEK|NOK|DKK|INR|HKD|SGD|KRW|BRL)\b"
+)
+CURRENCY_NAMES = {
+    "u.s. dollar": "USD",
+    "us dollar": "USD",
+    "euro": "EUR",
+    "british pound": "GBP",
+    "pound sterling": "GBP",
+    "swiss franc": "CHF",
+    "japanese yen": "JPY",
+    "chinese yuan": "CNY",
+    "canadian dollar": "CAD",
+    "australian dollar": "AUD",
+    "swedish krona": "SEK",
+    "indian rupee": "INR",
+}
+
+
+def _label_pattern(label):
+    # Factiva may write "Shareholders' Equity" for "Shareholders Equity"
+    words = r"\s+".join(re.escape(word) + "'?" for word in label.split())
+    return re.compile(
+        rf"^\s*{words}((?:\s+{VALUE_PATTERN})+)\s*$", re.IGNORECASE | re.MULTILINE
+    )
+
+
+def _find_years(lines) -> Optional[List[int]]:
+    for line in lines:
+        years = YEAR_PATTERN.findall(line)
+        if len(years) >= 2:
+            return [int(year) for year in years]
+    return None
+
+
+def _find_unit(lines) -> Optional[str]:
+    for line in lines:
+        scale = SCALE_PATTERN.search(line)
+        if scale is None:
+            continue
+        currency = CURRENCY_CODE_PATTERN.search(line)
+        if currency is not None:
+            return f"{scale.group(1).lower()} {currency.group(1)}"
+        for name, code in CURRENCY_NAMES.items():
+            if name in line.lower():
+                return f"{scale.group(1).lower()} {code}"
+    return None
+
+
+def _parse_table(lines, figures) -> Optional[Dict]:
+    years = _find_years(lines)
+    unit = _find_unit(lines)
+    if years is None or unit is None:
+        return None
+
+    text = "\n".join(lines)
+    table = {"Year": years}
+    for figure in figures:
+        match = _label_pattern(figure).search(text)
+        if match is None:
+            return None
+        values = re.findall(VALUE_PATTERN, match.group(1))
+        if len(values) != len(years):
+            return None
+        table[figure] = values
+    table["Unit"] = unit
+    return table
+
+
+def parse_factiva_table(text, heading, figures) -> Optional[Dict]:
+    """
+    Extracts figures from a fixed-layout table of a Factiva report, such as the
+    "Annual Income Statement" or the "Annual Balance Sheet", without the LLM.
+
+    The table starts at its heading, followed by a line of years, a line giving
+    the currency and scale (e.g. "Millions of U.S. Dollar") and one line per
+    figure: its label followed by one value per year.
+
+    Args:
+    - text (str): The text layer of the Factiva report.
+    - heading (str): The heading of the table.
+    - figures (List[str]): The labels of the figures to extract.
+
+    Returns:
+    - dict or None: The figures in the format asked to the LLM, e.g.
+    {'Year': [2022, 2021], 'Net Income': ['3,321.76', '(2.7)'], 'Unit': 'million USD'},
+    or None if the table or one of the figures could not be read.
+    """
+    lines = text.splitlines()
+    heading_pattern = re.compile(
+        r"^\s*" + r"\s+".join(map(re.escape, heading.split())) + r"\b", re.IGNORECASE
+    )
+    # The heading may also appear in a table of contents, every occurrence is tried
+    for index, line in enumerate(lines):
+        if heading_pattern.search(line):
+            table_lines = lines[index + 1 : index + MAX_TABLE_LINES]
+            for end, table_line in enumerate(table_lines):
+                if TABLE_HEADING_PATTERN.search(table_line):
+                    table_lines = table_lines[:end]
+                    break
+            table = _parse_table(table_lines, figures)
+            if table is not None:
+                return table
+    return None
@@ -1,9 +1,21 @@
+from src.document_loaders.configured_retriever import RetrievalConfig
+from src.document_loaders.pdf_loader import PdfLoader
 from src.document_loaders.serp_loader import SerpLoader
 from src.questions.abstract_question import QuestionWithLLM
+from src.questions.financials.factiva_table_parser import parse_factiva_table
 import json
 
 from src.utils.custom_errors import RetrievingError
 
+TABLE_HEADING = "Annual Balance Sheet"
+FIGURES = [
+    "Total Assets",
+    "Total Current Assets",
+    "Total Liabilities",
+    "Total Shareholders Equity",
+    "Total Current Liabilities",
+]
+
 
 class FinancialIndicatorQuestionBS(QuestionWithLLM):
     """
@@ -13,7 +25,7 @@ class FinancialIndicatorQuestionBS(QuestionWithLLM):
     _answer_as_dict = None
     _unit = None
 
-    def __init__(self, company_name, loader, backup_loaders=[]):
+    def __init__(self, company_name, loader, backup_loaders=None):
         self.company_name = company_name
         title = ""
         prompt = """
@@ -41,10 +53,18 @@ class FinancialIndicatorQuestionBS(QuestionWithLLM):
 
 """
         llm_model = "gpt4"
-        if backup_loaders == []:
-            backup_loaders.append(self._build_serp_loader(company_name))
+        retrieval_config = RetrievalConfig(sections=[TABLE_HEADING], k=2)
+        if backup_loaders is None:
+            backup_loaders = [self._build_serp_loader(company_name)]
 
-        super().__init__(title, prompt, loader, llm_model, backup_loaders)
+        super().__init__(
+            title,
+            prompt,
+            loader,
+            llm_model,
+            backup_loaders,
+            retrieval_config=retrieval_config,
+        )
 
     def _build_serp_loader(self, company_name):
         serp_prompts = [
@@ -60,13 +80,33 @@ class FinancialIndicatorQuestionBS(QuestionWithLLM):
             self._unit = self.answer_as_dict["Unit"]
         return self._unit
 
+    def _parse_answer(self, answer: str) -> dict:
+        table = json.loads(answer.replace("'", '"'))
+        if not isinstance(table, dict):
+            raise ValueError("The answer is not a JSON object")
+        return table
+
     @property
     def answer_as_dict(self):
+        """
+        Retrieves the figures of the Balance Sheet, read directly from the table of
+        the Factiva report when possible, otherwise extracted by the LLM.
+
+        Returns:
+        - dict: The figures by name, with their 'Year' and 'Unit'.
+        """
+        if self._answer_as_dict is None:
+            self._answer_as_dict = self._parse_factiva_table()
         if self._answer_as_dict is None:
             if not self._check_answer():
                 raise RetrievingError(
                     f"The annual Balance Sheet for {self.company_name} is not provided."
                 )
             answer: str = self.answer_json["answer"]
-            self._answer_as_dict = json.loads(answer.replace("'", '"'))
+            self._answer_as_dict = self._parse_answer(answer)
         return self._answer_as_dict
+
+    def _parse_factiva_table(self):
+        if not isinstance(self.loader, PdfLoader):
+            return None
+        return parse_factiva_table(self.loader.get_text(), TABLE_HEADING, FIGURES)
@@ -5,11 +5,119 @@ from src.questions.abstract_question import AbstractQuestion
 from src.questions.financials.financial_question_bs import FinancialIndicatorQuestionBS
 from src.questions.financials.financial_question_is import FinancialIndicatorQuestionIS
 from src.utils.custom_errors import RetrievingError
+from src.utils.file_utils import get_file_name
 
 
 json_path = os.path.join(os.getcwd(), "src/questions/financials", "alerts_config.json")
 alerts_params = json.load(open(json_path))
 
+DECREASING_ALERT_TITLE = (
+    "This figure is lower than the previous year which might be concerning"
+)
+RATIO_ALERT_TITLE = "This ratio is lower than {threshold} which might be concerning"
+
+
+def parse_financial_figures(answer: dict) -> pd.DataFrame:
+    """
+    Converts extracted financial figures into a numerical table indexed by year.
+    Figures are strings such as '3,321.76', negative figures being in parentheses.
+
+    Args:
+    - answer (dict): The figures by name, with their 'Year' and 'Unit'.
+
+    Returns:
+    - pd.DataFrame: The figures, one column per figure, indexed by year.
+    """
+    df = pd.DataFrame({key: value for key, value in answer.items() if key != "Unit"})
+    df.set_index("Year", inplace=True)
+    return df.apply(
+        lambda column: column.astype(str)
+        .str.replace(",", "", regex=False)
+        .str.replace(r"\((.*)\)", r"-\1", regex=True)
+        .astype(float)
+    )
+
+
+def add_ratios(table: pd.DataFrame) -> pd.DataFrame:
+    """
+    Adds the financial ratios computed from the figures.
+
+    Args:
+    - table (pd.DataFrame): The balance sheet and income statement figures.
+
+    Returns:
+    - pd.DataFrame: The table with the ratio columns added.
+    """
+    table["Debt-to-Equity Ratio"] = (
+        table["Total Liabilities"] / table["Total Shareholders Equity"]
+    )
+    table["Current Ratio"] = (
+        table["Total Current Assets"] / table["Total Current Liabilities"]
+    )
+    table["Return on Equity (ROE)"] = (
+        table["Total Liabilities"] / table["Total Current Liabilities"]
+    )
+    table["Operating Profit Margin"] = (
+        table["Net Income"] / table["Total Shareholders Equity"]
+    )
+    table["Net Profit margin"] = (
+        table["Operating Income"] / table["Net Sales or Revenue"]
+    )
+    return table
+
+
+def evaluate_alerts(table: pd.DataFrame, alerts_config: dict) -> pd.DataFrame:
+    """
+    Evaluates the alerts of the configuration on the numerical table.
+
+    Args:
+    - table (pd.DataFrame): The figures and ratios, indexed by year.
+    - alerts_config (dict): The alerts configuration (see alerts_config.json).
+
+    Returns:
+    - pd.DataFrame: Same shape as table, holding the alert message of each
+    concerning value and None elsewhere.
+    """
+    alerts = pd.DataFrame(None, index=table.index, columns=table.columns, dtype=object)
+
+    for col in alerts_config["decreasing_alert"]["column_names"]:
+        # Value of the year before each year, NaN when that year is not displayed
+        previous_year = table[col].reindex(table.index - 1).to_numpy()
+        alerts.loc[table[col].to_numpy() < previous_year, col] = DECREASING_ALERT_TITLE
+
+    for alert in alerts_config["ratio_lower_than_value_alerts"]:
+        message = RATIO_ALERT_TITLE.format(threshold=alert["threshold"])
+        for col in alert["column_names"]:
+            alerts.loc[table[col] < alert["threshold"], col] = message
+
+    return alerts
+
+
+def render_alerts(table: pd.DataFrame, alerts: pd.DataFrame) -> pd.DataFrame:
+    """
+    Highlights in red the values having an alert, for HTML display.
+
+    Args:
+    - table (pd.DataFrame): The figures and ratios.
+    - alerts (pd.DataFrame): The alert messages, see evaluate_alerts.
+
+    Returns:
+    - pd.DataFrame: The table, with concerning values as HTML spans.
+    """
+    rendered = table.copy()
+    for col in table.columns:
+        mask = alerts[col].notna()
+        if mask.any():
+            spans = (
+                '<span style="color: red" title="'
+                + alerts[col]
+                + '">'
+                + table[col].astype(str)
+                + "</span>"
+            )
+            rendered[col] = table[col].where(~mask, spans)
+    return rendered
+
 
 class MultipleFinancialIndicatorsQuestions(AbstractQuestion):
     def __init__(
@@ -47,79 +155,20 @@ class MultipleFinancialIndicatorsQuestions(AbstractQuestion):
             )
 
     def build_global_table(self) -> pd.DataFrame:
-        table_BS = self._convert_to_numerical_table(self.questionBS.answer_as_dict)
-        table_IS = self._convert_to_numerical_table(self.questionIS.answer_as_dict)
-        merged_table = pd.concat([table_BS, table_IS], axis=1)
-        merged_table_ratios = self._add_ratio(merged_table)
-        highlighted_table = self._highlight_table(merged_table_ratios.round(2))
-        return highlighted_table
-
-    def _convert_to_numerical_table(self, answer: json) -> pd.DataFrame:
-        df = pd.DataFrame(
-            {key: value for key, value in answer.items() if key != "Unit"}
-        )
-        df.set_index("Year", inplace=True)
-        df = df.applymap(
-            lambda x: float(x.replace(",", "").replace("(", "-").replace(")", ""))
-            if "(" in x and ")" in x
-            else float(x.replace(",", ""))
-        )
-        return df
-
-    def _add_ratio(self, table):
-        table["Debt-to-Equity Ratio"] = (
-            table["Total Liabilities"] / table["Total Shareholders Equity"]
-        )
-        table["Current Ratio"] = (
-            table["Total Current Assets"] / table["Total Current Liabilities"]
-        )
-        table["Return on Equity (ROE)"] = (
-            table["Total Liabilities"] / table["Total Current Liabilities"]
-        )
-        table["Operating Profit Margin"] = (
-            table["Net Income"] / table["Total Shareholders Equity"]
-        )
-        table["Net Profit margin"] = (
-            table["Operating Income"] / table["Net Sales or Revenue"]
-        )
-        return table
-
-    def _highlight_table(self, table):
-        for col in alerts_params["decreasing_alert"]["column_names"]:
-            table[col] = table[col].apply(
-                lambda x: self._highlight_decreasing_column(x, table[col])
-            )
-        for alert in alerts_params["ratio_lower_than_value_alerts"]:
-            for col in alert["column_names"]:
-                table[col] = table[col].apply(
-                    lambda x: self._highlight_ratios(x, alert["threshold"])
-                )
-        return table
+        table = self.compute_financial_table()
+        return render_alerts(table, evaluate_alerts(table, alerts_params))
 
-    def _highlight_decreasing_column(
-        self,
-        val,
-        entire_column,
-    ):
-        year = entire_column[entire_column == val].index[0]
-        next_val = (
-            entire_column.loc[year - 1] if year > entire_column.index.min() else None
-        )
-        if next_val is not None and val < next_val:
-            return (
-                f'<span style="color: red" '
-                f'title="This figure is lower than the previous year which might be concerning">'
-                f"{val}"
-                f"</span>"
-            )
-        else:
-            return val
+    def compute_financial_table(self) -> pd.DataFrame:
+        """
+        Computes the numerical table of figures and ratios, indexed by year.
 
-    def _highlight_ratios(self, val, threshold):
-        if val < threshold:
-            return f'<span style="color: red" title="This ratio is lower than {threshold} which might be concerning">{val}</span>'
-        else:
-            return val
+        Returns:
+        - pd.DataFrame: The figures and ratios, rounded to 2 decimals.
+        """
+        table_BS = parse_financial_figures(self.questionBS.answer_as_dict)
+        table_IS = parse_financial_figures(self.questionIS.answer_as_dict)
+        merged_table = pd.concat([table_BS, table_IS], axis=1)
+        return add_ratios(merged_table).round(2)
 
     def _get_source(self):
-        return "Source: " + os.path.basename(self.pdf_path)
+        return "Source: " + get_file_name(self.pdf_path)
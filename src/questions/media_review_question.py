@@ -1,3 +1,4 @@
+from src.document_loaders.configured_retriever import RetrievalConfig
 from src.document_loaders.serp_loader import SerpLoader
 from src.questions.abstract_question import QuestionWithLLM
 
@@ -11,7 +12,10 @@ class MediaReviewQuestion(QuestionWithLLM):
         llm_model = "gpt4"
         if loader is None:
             loader = self._build_loader(company_name)
-        super().__init__(title, prompt, loader, llm_model)
+        retrieval_config = RetrievalConfig(mmr=True)
+        super().__init__(
+            title, prompt, loader, llm_model, retrieval_config=retrieval_config
+        )
 
     def _build_loader(self, company_name):
         serp_prompts = [
@@ -1,4 +1,5 @@
 import json
+from src.document_loaders.configured_retriever import RetrievalConfig
 from src.document_loaders.serp_loader import SerpLoader
 from src.questions.abstract_question import QuestionWithLLM
 
@@ -6,7 +7,7 @@ from src.questions.abstract_question import QuestionWithLLM
 class BoardMembersQuestion(QuestionWithLLM):
     _answer_as_dict = None
 
-    def __init__(self, company_name, loader, backup_loaders=[]):
+    def __init__(self, company_name, loader, backup_loaders=None):
         self.company_name = company_name
         title = f" Who are the members of {company_name}'s Board of directors?"
         prompt = f"""
@@ -21,18 +22,32 @@ class BoardMembersQuestion(QuestionWithLLM):
         }}
         """
         llm_model = "gpt4"
-        if backup_loaders == []:
-            backup_loaders.append(self._build_serp_loader(company_name))
+        retrieval_config = RetrievalConfig(sections=["Board of Directors"], k=2)
+        if backup_loaders is None:
+            backup_loaders = [self._build_serp_loader(company_name)]
 
-        super().__init__(title, prompt, loader, llm_model, backup_loaders)
+        super().__init__(
+            title,
+            prompt,
+            loader,
+            llm_model,
+            backup_loaders,
+            retrieval_config=retrieval_config,
+        )
 
     def _build_serp_loader(self, company_name):
         serp_prompts = [f"{company_name} board members"]
         return SerpLoader(serp_prompts)
 
+    def _parse_answer(self, answer: str) -> dict:
+        table = json.loads(answer)
+        if not isinstance(table, dict):
+            raise ValueError("The answer is not a JSON object")
+        return table
+
     @property
     def answer_as_dict(self):
         if self._answer_as_dict is None:
             answer: str = self.answer_json["answer"]
-            self._answer_as_dict = json.loads(answer)
+            self._answer_as_dict = self._parse_answer(answer)
         return self._answer_as_dict
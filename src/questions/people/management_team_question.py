@@ -1,4 +1,5 @@
 import json
+from src.document_loaders.configured_retriever import RetrievalConfig
 from src.document_loaders.serp_loader import SerpLoader
 from src.questions.abstract_question import QuestionWithLLM
 
@@ -6,7 +7,7 @@ from src.questions.abstract_question import QuestionWithLLM
 class ManagementTeamQuestion(QuestionWithLLM):
     _answer_as_dict = None
 
-    def __init__(self, company_name, loader, backup_loaders=[]):
+    def __init__(self, company_name, loader, backup_loaders=None):
         self.company_name = company_name
         title = f"Who are the members of the management team at {company_name}?"
         prompt = f"""
@@ -24,10 +25,20 @@ class ManagementTeamQuestion(QuestionWithLLM):
         }}
         """
         llm_model = "gpt4"
-        if backup_loaders == []:
-            backup_loaders.append(self._build_serp_loader(company_name))
-
-        super().__init__(title, prompt, loader, llm_model, backup_loaders)
+        retrieval_config = RetrievalConfig(
+            sections=["Management Team", "Key Executives"], k=3
+        )
+        if backup_loaders is None:
+            backup_loaders = [self._build_serp_loader(company_name)]
+
+        super().__init__(
+            title,
+            prompt,
+            loader,
+            llm_model,
+            backup_loaders,
+            retrieval_config=retrieval_config,
+        )
 
     def _build_serp_loader(self, company_name):
         serp_prompts = [
@@ -35,9 +46,15 @@ class ManagementTeamQuestion(QuestionWithLLM):
         ]
         return SerpLoader(serp_prompts)
 
+    def _parse_answer(self, answer: str) -> dict:
+        table = json.loads(answer)
+        if not isinstance(table, dict):
+            raise ValueError("The answer is not a JSON object")
+        return table
+
     @property
     def answer_as_dict(self):
         if self._answer_as_dict is None:
             answer: str = self.answer_json["answer"]
-            self._answer_as_dict = json.loads(answer)
+            self._answer_as_dict = self._parse_answer(answer)
         return self._answer_as_dict
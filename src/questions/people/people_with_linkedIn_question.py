@@ -1,4 +1,6 @@
+import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 from src.document_loaders.serp_loader import SerpLoader
 from src.questions.abstract_question import AbstractQuestion
@@ -6,6 +8,8 @@ from src.questions.people.board_question import BoardMembersQuestion
 from src.questions.people.management_team_question import ManagementTeamQuestion
 from src.utils.custom_errors import RetrievingError
 
+LINKEDIN_LOOKUP_WORKERS = int(os.getenv("LINKEDIN_LOOKUP_WORKERS", "8"))
+
 
 class QuestionWithLinkedin(AbstractQuestion):
     def __init__(
@@ -17,23 +21,42 @@ class QuestionWithLinkedin(AbstractQuestion):
         self.company_name = company_name
         self.board = board
         self.management = management
+        # LinkedIn url of each person, by normalized name
+        self._linkedin_urls = {}
 
     def write(self, html_file):
-        try:
-            if not (self.management._check_answer()):
-                self.management._switch_retriever_and_reset()
-
-            self._write_table(html_file, self.management)
-
-            if not (self.board._check_answer()):
-                self.board._switch_retriever_and_reset()
+        people_questions = [self.management, self.board]
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [
+                executor.submit(self._resolve_people, people)
+                for people in people_questions
+            ]
+        # Each table is written on its own, even if the other one failed
+        tables, errors = {}, {}
+        for people, future in zip(people_questions, futures):
+            try:
+                tables[people] = future.result()
+            except RetrievingError as e:
+                errors[people] = e
+        self._linkedin_urls = self._get_urls_linkedIn(
+            [name for table in tables.values() for name in table["Name"]]
+        )
 
-            self._write_table(html_file, self.board)
+        for people in people_questions:
+            if people in errors:
+                html_file.write(
+                    '<h4 style="color: #d30473;font-size: 110%;">'
+                    + errors[people].__str__()
+                    + "</h4>\n"
+                )
+            else:
+                self._write_table(html_file, people)
 
-        except RetrievingError as e:
-            html_file.write(
-                '<h4 style="color: #d30473;font-size: 110%;">' + e.__str__() + "</h4>\n"
-            )
+    @staticmethod
+    def _resolve_people(people):
+        if not (people._check_answer()):
+            people._switch_retriever_and_reset()
+        return people.answer_as_dict
 
     def _write_table(self, html_file, people):
         html_file.write(
@@ -50,9 +73,10 @@ class QuestionWithLinkedin(AbstractQuestion):
             html_file.write("<a href=" + source + "> <li>" + source + "</li> </a>")
 
     def _build_table(self, table_data):
-        table = table_data.answer_as_dict
+        table = dict(table_data.answer_as_dict)
         table["LinkedIn Link"] = [
-            self._get_url_linkedIn(name) for name in table["Name"]
+            self._linkedin_urls.get(self._normalize_name(name), "Not found")
+            for name in table["Name"]
         ]
         df = pd.DataFrame(table)
         df["LinkedIn Link"] = df["LinkedIn Link"].apply(
@@ -60,14 +84,41 @@ class QuestionWithLinkedin(AbstractQuestion):
         )
         return df
 
+    @staticmethod
+    def _normalize_name(name):
+        # The LLM may give null or a number instead of a missing name
+        if not isinstance(name, str):
+            return ""
+        return " ".join(name.lower().split())
+
+    def _get_urls_linkedIn(self, names):
+        """
+        Looks up the LinkedIn urls of several people concurrently.
+        People appearing several times (e.g. in both the board and the
+        management team) are only looked up once, and missing names are not
+        looked up.
+
+        Args:
+        - names (List[str]): The names of the people.
+
+        Returns:
+        - dict: The LinkedIn url of each person, by normalized name.
+        """
+        unique_names = {}
+        for name in names:
+            normalized_name = self._normalize_name(name)
+            if normalized_name:
+                unique_names.setdefault(normalized_name, name)
+        with ThreadPoolExecutor(max_workers=LINKEDIN_LOOKUP_WORKERS) as executor:
+            urls = executor.map(self._get_url_linkedIn, unique_names.values())
+            return dict(zip(unique_names.keys(), urls))
+
     def _get_url_linkedIn(self, name):
-        url = self._build_serp_loader(name)._get_urls()[0]
         pattern = r"\b\w*linkedin\w*\b"
-        matches = re.findall(pattern, url, re.IGNORECASE)
-        if matches:
-            return url
-        else:
-            return "Not found"
+        for url in self._build_serp_loader(name)._get_urls():
+            if re.search(pattern, url, re.IGNORECASE):
+                return url
+        return "Not found"
 
     def _build_serp_loader(self, name):
         serp_prompts = [f"Linkedin {name} {self.company_name}"]
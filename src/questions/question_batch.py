@@ -0,0 +1,197 @@
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+from langchain.schema import Document
+from src.questions.abstract_question import QuestionWithLLM
+from src.utils.custom_prompt import batch_prompt_template
+from src.utils.rate_limit_utils import estimate_tokens
+
+
+BATCH_QUESTIONS = os.getenv("BATCH_QUESTIONS", "1") == "1"
+QUESTION_BATCH_SIZE = int(os.getenv("QUESTION_BATCH_SIZE", "5"))
+BATCH_MAX_CONTEXT_TOKENS = int(os.getenv("BATCH_MAX_CONTEXT_TOKENS", "12000"))
+
+
+class QuestionBatch:
+    """
+    Group of questions sharing the same loader and Language Model, answered by a
+    single LLM request over the union of the chunks retrieved for each of them.
+
+    The batch is resolved once, by the first question needing its answer. A
+    question whose answer is missing from the batch reply or cannot be parsed by
+    the question (or if the request fails) is asked on its own, and a question
+    whose batch answer is not relevant switches to its backup loaders as usual.
+    """
+
+    def __init__(
+        self,
+        questions: List[QuestionWithLLM],
+        max_context_tokens: int = BATCH_MAX_CONTEXT_TOKENS,
+    ):
+        """
+        Initializes a QuestionBatch object and attaches it to its questions.
+
+        Args:
+        - questions (List[QuestionWithLLM]): The questions, sharing the same loader
+        and llm_model.
+        - max_context_tokens (int): The maximum number of tokens of the extracted
+        parts sent with the questions.
+        """
+        self.questions = list(questions)
+        self.loader = self.questions[0].loader
+        self.max_context_tokens = max_context_tokens
+        self._answers: Optional[List[Optional[str]]] = None
+        self._lock = threading.Lock()
+        for question in self.questions:
+            question.batch = self
+
+    def get_answer(self, question: QuestionWithLLM) -> Optional[str]:
+        """
+        Retrieves the answer of a question of the batch, resolving the batch
+        on first call.
+
+        Args:
+        - question (QuestionWithLLM): The question.
+
+        Returns:
+        - str or None: The answer in the format of QuestionWithLLM.answer, or None
+        if the batch did not answer this question.
+        """
+        with self._lock:
+            if self._answers is None:
+                try:
+                    self._answers = self._ask()
+                except Exception as e:
+                    print(f"Batch of {len(self.questions)} questions failed: {e!r}")
+                    self._answers = [None] * len(self.questions)
+        return self._answers[self.questions.index(question)]
+
+    def _select_documents(self, ranked_documents: List[List[Document]]):
+        """
+        Merges the chunks retrieved for each question, taking the best remaining
+        chunk of each question in turn until the token budget is spent.
+
+        Args:
+        - ranked_documents (List[List[Document]]): The chunks of each question,
+        most relevant first.
+
+        Returns:
+        - List[Document]: The distinct chunks to send.
+        """
+        selected: Dict[tuple, Document] = {}
+        tokens = 0
+        for rank in range(max(len(documents) for documents in ranked_documents)):
+            for documents in ranked_documents:
+                if rank >= len(documents):
+                    continue
+                document = documents[rank]
+                key = (document.metadata.get("source"), document.page_content)
+                if key in selected:
+                    continue
+                document_tokens = estimate_tokens(document.page_content)
+                if tokens + document_tokens > self.max_context_tokens:
+                    return list(selected.values())
+                selected[key] = document
+                tokens += document_tokens
+        return list(selected.values())
+
+    def _build_prompt(self, documents: List[Document]) -> str:
+        summaries = "\n".join(
+            f"Content: {document.page_content}\n"
+            f"Source: {document.metadata.get('source')}"
+            for document in documents
+        )
+        questions = "\n".join(
+            f"QUESTION {number}: {question.prompt.strip()}"
+            for number, question in enumerate(self.questions, start=1)
+        )
+        return batch_prompt_template.format(summaries=summaries, questions=questions)
+
+    def _ask(self) -> List[Optional[str]]:
+        ranked_documents = []
+        for question in self.questions:
+            retriever = self.loader.get_retriever(question.retrieval_config)
+            ranked_documents.append(retriever.get_relevant_documents(question.prompt))
+        prompt = self._build_prompt(self._select_documents(ranked_documents))
+        reply = _parse_json_object(self.questions[0]._select_llm().predict(prompt))
+
+        answers = []
+        for number, question in enumerate(self.questions, start=1):
+            entry = reply.get(str(number))
+            if not isinstance(entry, dict) or not entry.get("answer"):
+                answers.append(None)
+                continue
+            answer = entry["answer"]
+            if not isinstance(answer, str):
+                answer = json.dumps(answer)
+            if not question._is_valid_answer(answer):
+                answers.append(None)
+                continue
+            sources = entry.get("sources") or ""
+            if isinstance(sources, list):
+                sources = " ; ".join(sources)
+            answers.append(
+                json.dumps(
+                    {"question": question.prompt, "answer": answer, "sources": sources}
+                )
+            )
+        print(
+            f"Batch of {len(self.questions)} questions answered in one call, "
+            f"{answers.count(None)} to ask again on their own"
+        )
+        return answers
+
+
+def _parse_json_object(text: str) -> dict:
+    """
+    Parses the JSON object of an LLM reply, ignoring text or code fences
+    around it.
+
+    Args:
+    - text (str): The reply.
+
+    Returns:
+    - dict: The JSON object.
+
+    Raises:
+    - ValueError: If the reply holds no JSON object.
+    """
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end < start:
+        raise ValueError("No JSON object in the reply")
+    value = json.loads(text[start : end + 1])
+    if not isinstance(value, dict):
+        raise ValueError("The reply is not a JSON object")
+    return value
+
+
+def batch_questions(
+    questions: List[QuestionWithLLM], batch_size: int = QUESTION_BATCH_SIZE
+) -> List[QuestionBatch]:
+    """
+    Groups the questions sharing the same loader and Language Model into batches
+    answered by a single LLM request each. Does nothing if BATCH_QUESTIONS is
+    disabled.
+
+    Args:
+    - questions (List[QuestionWithLLM]): The questions to group.
+    - batch_size (int): The maximum number of questions per batch.
+
+    Returns:
+    - List[QuestionBatch]: The batches of at least 2 questions.
+    """
+    if not BATCH_QUESTIONS:
+        return []
+    groups: Dict[tuple, List[QuestionWithLLM]] = {}
+    for question in questions:
+        groups.setdefault((id(question.loader), question.llm_model), []).append(
+            question
+        )
+    batches = []
+    for group in groups.values():
+        for i in range(0, len(group), batch_size):
+            chunk = group[i : i + batch_size]
+            if len(chunk) > 1:
+                batches.append(QuestionBatch(chunk))
+    return batches
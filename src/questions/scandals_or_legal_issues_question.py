@@ -1,3 +1,4 @@
+from src.document_loaders.configured_retriever import RetrievalConfig
 from src.document_loaders.serp_loader import SerpLoader
 from src.questions.abstract_question import QuestionWithLLM
 
@@ -12,7 +13,10 @@ class ScandalsQuestion(QuestionWithLLM):
         if loader is None:
             loader = self._build_loader(company_name)
         llm_model = "gpt4"
-        super().__init__(title, prompt, loader, llm_model)
+        retrieval_config = RetrievalConfig(mmr=True)
+        super().__init__(
+            title, prompt, loader, llm_model, retrieval_config=retrieval_config
+        )
 
     def _build_loader(self, company_name):
         serp_prompts = [
@@ -1,7 +1,12 @@
 from src.questions.abstract_question import AbstractQuestion
 import pandas as pd
 import plotly.express as px
-import os
+from src.utils.file_utils import get_file_name
+from src.utils.spendcube_utils import (
+    SPENDCUBE_COLUMNS,
+    SpendRollup,
+    read_spendcube,
+)
 
 
 class SpendCubeQuestion(AbstractQuestion):
@@ -15,11 +20,16 @@ class SpendCubeQuestion(AbstractQuestion):
 
         Args:
         - company_name (str): Name of the company.
-        - csv_path (str): Path to the CSV file containing spending data.
+        - csv_path (str, io.BytesIO or CachedSpendCube): Path to the spending data
+        xlsx file, the named in-memory file or the cached Azure workbook.
         """
         self.company_name = company_name
         self.path = csv_path
-        self.data = pd.read_excel(csv_path, engine="openpyxl")
+        # Only the spend sums are kept, the raw rows are dropped after ingestion
+        self.rollup = SpendRollup.from_frame(
+            read_spendcube(csv_path, columns=SPENDCUBE_COLUMNS)
+        )
+        self._spend_by_year = None
 
     def write(self, html_file):
         """
@@ -70,6 +80,18 @@ class SpendCubeQuestion(AbstractQuestion):
         )
         html_file.write("</h4>\n")
 
+    @property
+    def spend_by_year(self):
+        """
+        Retrieves the total spend with the company for each fiscal year.
+
+        Returns:
+        - pandas Series: The spend in euros rounded to 2 decimals, by fiscal year.
+        """
+        if self._spend_by_year is None:
+            self._spend_by_year = self.rollup.spend_by_year().round(2)
+        return self._spend_by_year
+
     def _get_spending_data(self):
         """
         Generates spending data summary for the company across fiscal years.
@@ -77,7 +99,7 @@ class SpendCubeQuestion(AbstractQuestion):
         Returns:
         - str: Annual spending data for each year.
         """
-        grouped_data = self.data.groupby("fiscal_year")["spend_in_eur"].sum().round(2)
+        grouped_data = self.spend_by_year
         result_strings = [
             f"<br> In {fiscal_year}, the amount spent with {self.company_name}"
             + f"was {'{:,}'.format(spend_in_eur).replace(',', ' ')} euros"
@@ -92,7 +114,7 @@ class SpendCubeQuestion(AbstractQuestion):
         Returns:
         - Plotly figure: Bar graph displaying spending data.
         """
-        grouped_data = self.data.groupby("fiscal_year")["spend_in_eur"].sum().round(2)
+        grouped_data = self.spend_by_year
         fig = px.bar(
             grouped_data,
             x=grouped_data.index,
@@ -109,12 +131,7 @@ class SpendCubeQuestion(AbstractQuestion):
         Returns:
         - pandas DataFrame: List of purchasers with their spending details.
         """
-        pivoted_df = self.data.pivot_table(
-            index=entity,
-            columns="fiscal_year",
-            values="spend_in_eur",
-            aggfunc="sum",
-        )
+        pivoted_df = self.rollup.pivot(entity)
         pivoted_df = pivoted_df.fillna(0)
 
         pivoted_df["total_spend"] = pivoted_df.sum(axis=1)
@@ -138,4 +155,4 @@ class SpendCubeQuestion(AbstractQuestion):
         Returns:
         - str: Information about the source of spending data.
         """
-        return "Source: " + os.path.basename(self.path)
+        return "Source: " + get_file_name(self.path)
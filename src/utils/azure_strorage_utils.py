@@ -1,3 +1,4 @@
+import io
 import random
 import string
 
@@ -5,3 +6,29 @@ import string
 def generate_random_string(length):
     letters = string.ascii_lowercase
     return "".join(random.choice(letters) for i in range(length))
+
+
+def download_blob_to_buffer(container_client, blob_name, max_concurrency=4):
+    """
+    Downloads a blob into memory. The blob is streamed chunk by chunk straight
+    into the buffer, without any temporary file or intermediate copy.
+
+    Args:
+    - container_client (ContainerClient): The client of the blob container.
+    - blob_name (str): The name of the blob.
+    - max_concurrency (int): The number of chunks downloaded in parallel.
+
+    Returns:
+    - io.BytesIO: The content of the blob, with the blob name as `name`.
+
+    Raises:
+    - ResourceNotFoundError: If the blob does not exist.
+    """
+    buffer = io.BytesIO()
+    downloader = container_client.download_blob(
+        blob_name, max_concurrency=max_concurrency
+    )
+    downloader.readinto(buffer)
+    buffer.seek(0)
+    buffer.name = blob_name
+    return buffer
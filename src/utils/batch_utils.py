@@ -0,0 +1,162 @@
+import csv
+import os
+import re
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+from src.utils.questions_and_report_utils import (
+    build_report,
+    generate_list_of_questions,
+)
+
+
+# Number of companies whose questions are queued at the same time. The questions
+# themselves all run on the shared question executor (see execution_utils), so
+# this only keeps enough work queued to keep that executor busy.
+MAX_BATCH_COMPANIES = int(os.getenv("MAX_BATCH_COMPANIES", "4"))
+
+MANIFEST_COLUMNS = ["company", "factiva_pdf", "spend_file"]
+SUMMARY_COLUMNS = ["company", "status", "seconds", "report", "error"]
+
+
+def read_manifest(manifest_path) -> List[Dict[str, str]]:
+    """
+    Reads a portfolio manifest: a CSV file with one row per company and the
+    columns company, factiva_pdf and spend_file. Relative file paths are resolved
+    from the directory of the manifest. Rows without a company, and the rows of a
+    company already listed, are skipped.
+
+    Args:
+    - manifest_path (str): The path to the manifest.
+
+    Returns:
+    - List[Dict[str, str]]: The rows of the manifest, each with the file name of
+    its report ("report_name"), unique within the manifest.
+
+    Raises:
+    - ValueError: If a column is missing.
+    """
+    with open(manifest_path, newline="") as f:
+        reader = csv.DictReader(f)
+        missing = set(MANIFEST_COLUMNS) - set(reader.fieldnames or [])
+        if missing:
+            raise ValueError(
+                f"Missing columns in {manifest_path}: {', '.join(sorted(missing))}"
+            )
+        rows = []
+        companies = set()
+        for row in reader:
+            # Short rows have None for their missing fields
+            row = {
+                column: (row.get(column) or "").strip() for column in MANIFEST_COLUMNS
+            }
+            if not row["company"]:
+                print(f"Skipping line {reader.line_num} of {manifest_path}: no company")
+                continue
+            if row["company"].lower() in companies:
+                print(
+                    f"Skipping line {reader.line_num} of {manifest_path}: "
+                    f"{row['company']} is already listed"
+                )
+                continue
+            companies.add(row["company"].lower())
+            rows.append(row)
+
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    report_names = set()
+    for row in rows:
+        for column in ["factiva_pdf", "spend_file"]:
+            if row[column]:
+                row[column] = os.path.join(base_dir, row[column])
+        row["report_name"] = _unique_report_name(row["company"], report_names)
+    return rows
+
+
+def _unique_report_name(company_name, report_names):
+    """
+    Builds the file name of the report of a company, safe on any file system and
+    not in report_names, which it is added to.
+
+    Args:
+    - company_name (str): The name of the company.
+    - report_names (Set[str]): The file names already taken, in lower case.
+
+    Returns:
+    - str: The file name.
+    """
+    # No path separators or characters forbidden on Windows, no leading dot
+    base_name = re.sub(r'[\\/:*?"<>|\x00-\x1f]', "_", company_name).strip(" .")
+    base_name = base_name or "report"
+    name, number = f"{base_name}.html", 1
+    while name.lower() in report_names:
+        number += 1
+        name = f"{base_name} ({number}).html"
+    report_names.add(name.lower())
+    return name
+
+
+def _generate_company_report(row, output_dir):
+    start = time.perf_counter()
+    report_path = os.path.join(output_dir, row["report_name"])
+    result = {"company": row["company"], "report": report_path, "error": ""}
+    try:
+        questions = generate_list_of_questions(
+            row["company"], row["factiva_pdf"], row["spend_file"]
+        )
+        build_report(questions, row["company"], report_path)
+        result["status"] = "done"
+    except Exception as e:
+        traceback.print_exc()
+        result["status"] = "error"
+        result["report"] = ""
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = round(time.perf_counter() - start, 1)
+    print(f"{row['company']}: {result['status']} in {result['seconds']}s")
+    return result
+
+
+def run_portfolio(
+    rows: List[Dict[str, str]], output_dir, max_companies=MAX_BATCH_COMPANIES
+) -> List[Dict]:
+    """
+    Generates the reports of a portfolio of companies in one run.
+
+    All the reports share the same LLM and embedding clients, caches and question
+    executor, so the number of concurrent calls to the providers stays bounded for
+    the whole run. A company failing does not stop the others.
+
+    Args:
+    - rows (List[Dict[str, str]]): The companies, with their report file name,
+    see read_manifest.
+    - output_dir (str): The directory where the HTML reports are written.
+    - max_companies (int): The number of companies processed at the same time.
+
+    Returns:
+    - List[Dict]: One summary per company, in the order of rows, with its status,
+    duration in seconds, report path and error.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    with ThreadPoolExecutor(
+        max_workers=max_companies, thread_name_prefix="company"
+    ) as executor:
+        futures = [
+            executor.submit(_generate_company_report, row, output_dir) for row in rows
+        ]
+        return [future.result() for future in futures]
+
+
+def write_summary(results: List[Dict], summary_path):
+    """
+    Writes the summary of a portfolio run as a CSV file.
+
+    Args:
+    - results (List[Dict]): The summaries returned by run_portfolio.
+    - summary_path (str): The path to the CSV file.
+    """
+    with open(summary_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_COLUMNS)
+        writer.writeheader()
+        writer.writerows(results)
+    failures = sum(result["status"] != "done" for result in results)
+    print(f"{len(results) - failures} reports generated, {failures} failed")
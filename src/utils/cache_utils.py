@@ -0,0 +1,188 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(os.getcwd(), "cache"))
+
+
+def get_cache_dir(name):
+    """
+    Returns the directory of a named local cache, creating it if needed.
+
+    Args:
+    - name (str): The name of the cache (e.g. "embeddings").
+
+    Returns:
+    - str: The path to the cache directory.
+    """
+    path = os.path.join(CACHE_DIR, name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def hash_text(text):
+    """
+    Hashes a text into a stable hexadecimal key.
+
+    Args:
+    - text (str): The text to hash.
+
+    Returns:
+    - str: The sha256 hexadecimal digest of the text.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def hash_file(source, block_size=1 << 20):
+    """
+    Hashes the content of a file into a stable hexadecimal key.
+
+    Args:
+    - source (str or io.BytesIO): The path to the file or the in-memory file.
+    - block_size (int): The size of the blocks read from the file.
+
+    Returns:
+    - str: The sha256 hexadecimal digest of the file content.
+    """
+    if not isinstance(source, str):
+        return hashlib.sha256(source.getbuffer()).hexdigest()
+    digest = hashlib.sha256()
+    with open(source, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class DiskCache:
+    """
+    Persistent key-value cache storing one JSON file per entry.
+
+    Entries expire after `ttl` seconds, and the least recently used entries are
+    evicted once the files take more than `max_bytes`. Values must be JSON
+    serializable.
+    """
+
+    def __init__(self, name, ttl=None, max_bytes=None):
+        """
+        Initializes a DiskCache object and indexes the entries already on disk.
+
+        Args:
+        - name (str): The name of the cache, used as directory name.
+        - ttl (float, optional): The lifetime of an entry in seconds.
+        Defaults to no expiry.
+        - max_bytes (int, optional): The maximum size of the cache in bytes.
+        Defaults to no limit.
+        """
+        self.directory = get_cache_dir(name)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # file name -> (size, creation time), from least to most recently used
+        self._entries = OrderedDict()
+        self._size = 0
+        self._load_entries()
+
+    def _load_entries(self):
+        files = []
+        for file_name in os.listdir(self.directory):
+            if file_name.endswith(".json"):
+                stat = os.stat(os.path.join(self.directory, file_name))
+                files.append((stat.st_atime, file_name, stat.st_size, stat.st_mtime))
+        for _, file_name, size, created_at in sorted(files):
+            self._entries[file_name] = (size, created_at)
+            self._size += size
+
+    def _file_name(self, key):
+        return hash_text(key) + ".json"
+
+    def _remove(self, file_name):
+        size, _ = self._entries.pop(file_name)
+        self._size -= size
+        try:
+            os.remove(os.path.join(self.directory, file_name))
+        except FileNotFoundError:
+            pass
+
+    def get(self, key, default=None):
+        """
+        Retrieves the value of a key.
+
+        Args:
+        - key (str): The key.
+        - default (optional): The value returned on a miss. Defaults to None.
+
+        Returns:
+        - The cached value, or default if the key is missing or expired.
+        """
+        file_name = self._file_name(key)
+        with self._lock:
+            entry = self._entries.get(file_name)
+            if entry is not None and self.ttl and time.time() - entry[1] > self.ttl:
+                self._remove(file_name)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(file_name)
+            try:
+                with open(os.path.join(self.directory, file_name)) as f:
+                    value = json.load(f)["value"]
+            except (OSError, ValueError):
+                self._remove(file_name)
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """
+        Stores the value of a key, evicting least recently used entries if needed.
+
+        Args:
+        - key (str): The key.
+        - value: The JSON serializable value.
+        """
+        file_name = self._file_name(key)
+        data = json.dumps({"key": key, "value": value})
+        path = os.path.join(self.directory, file_name)
+        with self._lock:
+            if file_name in self._entries:
+                self._remove(file_name)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            size = os.path.getsize(path)
+            self._entries[file_name] = (size, time.time())
+            self._size += size
+            while self.max_bytes and self._size > self.max_bytes and self._entries:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        """
+        Removes all the entries of the cache.
+        """
+        with self._lock:
+            for file_name in list(self._entries):
+                self._remove(file_name)
+
+    def stats(self):
+        """
+        Returns the usage statistics of the cache.
+
+        Returns:
+        - dict: The number of hits, misses, entries and the size in bytes.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._size,
+            }
@@ -0,0 +1,89 @@
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent calls sharing the same key: the first caller runs the
+    function while the others wait for its result. Once the call is over the key
+    is released, so this is not a cache.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """
+        Runs fn once for all the callers asking for the same key at the same time.
+
+        Args:
+        - key (Hashable): The key identifying the call.
+        - fn (Callable): The function to run.
+
+        Returns:
+        - Any: The result of fn, shared by all the callers.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+
+        if not leader:
+            return future.result()
+
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return future.result()
+
+
+_process_pools: Dict[str, ProcessPoolExecutor] = {}
+_process_pools_lock = threading.Lock()
+
+
+def get_process_pool(name: str, max_workers: int) -> ProcessPoolExecutor:
+    """
+    Returns the long-lived process pool of the given name, created on first use
+    and shared by all the requests. The workers are started with "spawn", as
+    forking a process running server threads may copy locks held by them.
+
+    Args:
+    - name (str): The name of the pool.
+    - max_workers (int): The number of worker processes, used when the pool is
+    created.
+
+    Returns:
+    - ProcessPoolExecutor: The pool.
+    """
+    with _process_pools_lock:
+        pool = _process_pools.get(name)
+        if pool is None:
+            pool = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            _process_pools[name] = pool
+        return pool
+
+
+def discard_process_pool(name: str):
+    """
+    Shuts down a process pool, e.g. broken by a worker that died, so that the
+    next call of get_process_pool creates a new one.
+
+    Args:
+    - name (str): The name of the pool.
+    """
+    with _process_pools_lock:
+        pool = _process_pools.pop(name, None)
+    if pool is not None:
+        pool.shutdown(wait=False)
@@ -2,3 +2,9 @@ class RetrievingError(Exception):
     def __init__(self, message):
         self.message = message
         super().__init__(self.message)
+
+
+class JobQueueFullError(Exception):
+    def __init__(self, message):
+        self.message = message
+        super().__init__(self.message)
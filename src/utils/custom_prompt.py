@@ -108,3 +108,21 @@ QUESTION: {question}
 {summaries}
 =========
 FINAL ANSWER:"""
+
+batch_prompt_template = """Given the following extracted parts of a long document and several numbered questions, answer
+each question with references ("sources").
+If you don't know the answer to a question, just say that you don't know and return empty sources for it.
+Don't try to make up an answer.
+The sources should NOT appear in the answer but only in the sources of the answer.
+The word "source" should NOT be in the answer.
+
+Format: Return only a JSON object with one entry per question number, as follows:
+{{"1": {{"answer": "...", "sources": "source 1 ; source 2"}}, "2": {{"answer": "...", "sources": ""}}}}
+When a question asks for an answer in a json format, write this json as a string in "answer".
+
+=========
+{summaries}
+=========
+{questions}
+
+JSON ANSWER:"""
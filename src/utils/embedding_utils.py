@@ -0,0 +1,340 @@
+import contextlib
+import fcntl
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+import numpy as np
+from langchain.embeddings.base import Embeddings
+from src.utils.cache_utils import get_cache_dir, hash_text
+from src.utils.rate_limit_utils import (
+    DeploymentRateLimiter,
+    estimate_tokens,
+    get_rate_limiter,
+)
+
+
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "50000"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "16"))
+EMBED_MAX_IN_FLIGHT = int(os.getenv("EMBED_MAX_IN_FLIGHT", "4"))
+EMBED_REQUESTS_PER_MINUTE = float(os.getenv("EMBED_REQUESTS_PER_MINUTE", "120"))
+EMBED_TOKENS_PER_MINUTE = float(os.getenv("EMBED_TOKENS_PER_MINUTE", "240000"))
+
+
+class EmbeddingCache:
+    """
+    Size-bounded, persistent store of embeddings, shareable by several processes.
+
+    Vectors are kept in a memory-mapped float32 array of fixed capacity
+    (vectors.f32). The mapping from key to row is an append-only log (index.log)
+    of "row key" records, a later record of a row replacing the previous one, so
+    storing embeddings only appends a few lines. The log is compacted once it
+    holds much more records than entries. When the store is full the least
+    recently used row is overwritten.
+
+    The files are locked across processes (shared for reads, exclusive for
+    writes), and each process replays the records appended by the others before
+    using the index. All the processes must use the same max_entries.
+    """
+
+    def __init__(self, directory, max_entries=EMBEDDING_CACHE_MAX_ENTRIES):
+        """
+        Initializes an EmbeddingCache object.
+
+        Args:
+        - directory (str): The directory holding the cache files.
+        - max_entries (int): The maximum number of embeddings kept.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.max_entries = max_entries
+        self._vectors_path = os.path.join(directory, "vectors.f32")
+        self._log_path = os.path.join(directory, "index.log")
+        self._meta_path = os.path.join(directory, "meta.json")
+        self._lock = threading.Lock()
+        self._lock_file = open(os.path.join(directory, "lock"), "a")
+        # key -> row, from least to most recently used
+        self._slots: "OrderedDict[str, int]" = OrderedDict()
+        self._keys_by_slot: Dict[int, str] = {}
+        self._vectors = None
+        self._log_inode = None
+        self._log_offset = 0
+        self._log_records = 0
+        with self._lock, self._file_lock(fcntl.LOCK_EX):
+            self._check_meta()
+            self._catch_up()
+
+    @contextlib.contextmanager
+    def _file_lock(self, operation):
+        fcntl.flock(self._lock_file, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _read_meta(self):
+        try:
+            with open(self._meta_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write_meta(self, dim):
+        tmp_path = self._meta_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"max_entries": self.max_entries, "dim": dim}, f)
+        os.replace(tmp_path, self._meta_path)
+
+    def _check_meta(self):
+        meta = self._read_meta()
+        if meta is not None and meta["max_entries"] == self.max_entries:
+            return
+        if meta is not None:
+            print("Embedding cache capacity changed, the cache is reset")
+        for path in [self._log_path, self._vectors_path]:
+            if os.path.exists(path):
+                os.remove(path)
+        self._write_meta(None)
+
+    def _open_vectors(self, create=False):
+        meta = self._read_meta()
+        if meta is None or meta["dim"] is None:
+            return
+        self._vectors = np.memmap(
+            self._vectors_path,
+            dtype=np.float32,
+            mode="w+" if create else "r+",
+            shape=(self.max_entries, meta["dim"]),
+        )
+
+    def _assign(self, key, slot):
+        previous_key = self._keys_by_slot.get(slot)
+        if previous_key is not None and previous_key != key:
+            del self._slots[previous_key]
+        previous_slot = self._slots.pop(key, None)
+        if previous_slot is not None and previous_slot != slot:
+            del self._keys_by_slot[previous_slot]
+        self._slots[key] = slot
+        self._keys_by_slot[slot] = key
+
+    def _catch_up(self):
+        """
+        Replays the records appended to the log since the last call, by this
+        process or others. Must be called with the file lock held.
+        """
+        try:
+            stat = os.stat(self._log_path)
+        except FileNotFoundError:
+            stat = None
+        inode = stat.st_ino if stat is not None else None
+        if inode != self._log_inode or (stat and stat.st_size < self._log_offset):
+            # The log was compacted or reset by another process
+            self._slots.clear()
+            self._keys_by_slot.clear()
+            self._log_inode = inode
+            self._log_offset = 0
+            self._log_records = 0
+        if self._vectors is None:
+            self._open_vectors()
+        if stat is None or stat.st_size == self._log_offset:
+            return
+
+        with open(self._log_path, "rb") as f:
+            f.seek(self._log_offset)
+            data = f.read()
+        # A record being written by a crashed process has no end of line yet
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].decode().splitlines():
+            slot, key = line.split(" ", 1)
+            self._assign(key, int(slot))
+            self._log_records += 1
+        self._log_offset += end
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """
+        Looks up several embeddings at once.
+
+        Args:
+        - keys (List[str]): The keys to look up.
+
+        Returns:
+        - Dict[str, List[float]]: The embeddings found, by key.
+        """
+        found = {}
+        with self._lock, self._file_lock(fcntl.LOCK_SH):
+            self._catch_up()
+            for key in keys:
+                slot = self._slots.get(key)
+                if slot is not None:
+                    self._slots.move_to_end(key)
+                    found[key] = self._vectors[slot].tolist()
+        return found
+
+    def put_many(self, embeddings: Dict[str, List[float]]):
+        """
+        Stores several embeddings at once and appends their records to the log.
+
+        Args:
+        - embeddings (Dict[str, List[float]]): The embeddings to store, by key.
+        """
+        if not embeddings:
+            return
+        with self._lock, self._file_lock(fcntl.LOCK_EX):
+            self._catch_up()
+            if self._vectors is None:
+                self._write_meta(len(next(iter(embeddings.values()))))
+                self._open_vectors(create=True)
+
+            records = []
+            for key, vector in embeddings.items():
+                slot = self._slots.get(key)
+                if slot is None:
+                    if len(self._slots) < self.max_entries:
+                        slot = len(self._slots)
+                    else:
+                        slot = next(iter(self._slots.values()))
+                self._vectors[slot] = vector
+                self._assign(key, slot)
+                records.append(f"{slot} {key}\n")
+            # Vectors are written before the records making them visible
+            self._vectors.flush()
+            self._append_records("".join(records))
+
+            if self._log_records > 2 * max(len(self._slots), 1000):
+                self._compact()
+
+    def _append_records(self, text):
+        data = text.encode()
+        with open(self._log_path, "ab") as f:
+            f.write(data)
+        if self._log_inode is None:
+            self._log_inode = os.stat(self._log_path).st_ino
+        self._log_offset += len(data)
+        self._log_records += text.count("\n")
+
+    def _compact(self):
+        """
+        Rewrites the log with one record per entry, in least to most recently
+        used order. Must be called with the exclusive file lock held.
+        """
+        tmp_path = self._log_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.writelines(f"{slot} {key}\n" for key, slot in self._slots.items())
+        os.replace(tmp_path, self._log_path)
+        stat = os.stat(self._log_path)
+        self._log_inode = stat.st_ino
+        self._log_offset = stat.st_size
+        self._log_records = len(self._slots)
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that only sends to the underlying embedder the texts
+    that are not already in the local embedding cache.
+    """
+
+    def __init__(self, embedder: Embeddings, model_name: str):
+        """
+        Initializes a CachedEmbeddings object.
+
+        Args:
+        - embedder (Embeddings): The embedder used on cache misses.
+        - model_name (str): The name of the embedding model, used to key the cache.
+        """
+        self.embedder = embedder
+        self.model_name = model_name
+        cache_name = os.path.join("embeddings", re.sub(r"\W", "_", model_name))
+        self.cache = EmbeddingCache(get_cache_dir(cache_name))
+
+    def _key(self, text):
+        return hash_text(self.model_name + "\n" + text)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        embeddings = self.cache.get_many(keys)
+
+        missing = OrderedDict()
+        for key, text in zip(keys, texts):
+            if key not in embeddings:
+                missing[key] = text
+        if missing:
+            print(
+                f"Embedding cache: {len(texts) - len(missing)} hits, "
+                f"{len(missing)} misses"
+            )
+            new_embeddings = dict(
+                zip(
+                    missing.keys(),
+                    self.embedder.embed_documents(list(missing.values())),
+                )
+            )
+            self.cache.put_many(new_embeddings)
+            embeddings.update(new_embeddings)
+
+        return [embeddings[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class BatchedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that groups texts into deployment-sized batches and keeps
+    several batches in flight at once, within the rate limits of the deployment.
+
+    The underlying embedder must accept `batch_size` texts in a single request
+    (i.e. OpenAIEmbeddings created with chunk_size=batch_size), and should not
+    retry by itself as the rate limiter handles the retries.
+    """
+
+    def __init__(
+        self,
+        embedder: Embeddings,
+        deployment_name: str,
+        batch_size: int = EMBED_BATCH_SIZE,
+        max_in_flight: int = EMBED_MAX_IN_FLIGHT,
+    ):
+        """
+        Initializes a BatchedEmbeddings object.
+
+        Args:
+        - embedder (Embeddings): The embedder sending the requests.
+        - deployment_name (str): The name of the deployment, whose rate limiter
+        is shared by all its users.
+        - batch_size (int): The number of texts sent per request.
+        - max_in_flight (int): The maximum number of concurrent requests.
+        """
+        self.embedder = embedder
+        self.batch_size = batch_size
+        self.rate_limiter: DeploymentRateLimiter = get_rate_limiter(
+            deployment_name,
+            requests_per_minute=EMBED_REQUESTS_PER_MINUTE,
+            tokens_per_minute=EMBED_TOKENS_PER_MINUTE,
+            max_concurrency=max_in_flight,
+        )
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_in_flight, thread_name_prefix="embedding"
+        )
+
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        tokens = sum(estimate_tokens(text) for text in batch)
+        return self.rate_limiter.call(
+            lambda: self.embedder.embed_documents(batch), tokens
+        )
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        batches = [
+            texts[i : i + self.batch_size]
+            for i in range(0, len(texts), self.batch_size)
+        ]
+        embeddings = []
+        for batch_embeddings in self._executor.map(self._embed_batch, batches):
+            embeddings.extend(batch_embeddings)
+        return embeddings
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.rate_limiter.call(
+            lambda: self.embedder.embed_query(text), estimate_tokens(text)
+        )
@@ -0,0 +1,88 @@
+import functools
+import io
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, List, Optional, Tuple
+from src.questions.abstract_question import AbstractQuestion
+
+
+MAX_QUESTION_WORKERS = int(os.getenv("MAX_QUESTION_WORKERS", "8"))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_question_executor() -> ThreadPoolExecutor:
+    """
+    Returns the process-wide thread pool used to resolve questions.
+
+    The pool is shared by every report built in the process, so the number of
+    questions resolved at the same time stays bounded by MAX_QUESTION_WORKERS.
+
+    Returns:
+    - ThreadPoolExecutor: The shared executor.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=MAX_QUESTION_WORKERS, thread_name_prefix="question"
+            )
+        return _executor
+
+
+def render_question(question: AbstractQuestion) -> Tuple[str, float]:
+    """
+    Resolves a question and renders its HTML section in memory.
+
+    Args:
+    - question (AbstractQuestion): The question to resolve.
+
+    Returns:
+    - Tuple[str, float]: The HTML section and the time spent in seconds.
+    """
+    start = time.perf_counter()
+    buffer = io.StringIO()
+    question.write(buffer)
+    return buffer.getvalue(), time.perf_counter() - start
+
+
+def run_questions(
+    questions: List[AbstractQuestion],
+    on_done: Optional[Callable[[int, AbstractQuestion, Optional[float]], None]] = None,
+) -> Iterator[Tuple[AbstractQuestion, str, float]]:
+    """
+    Resolves all questions concurrently and yields their HTML sections
+    in the original order of the list.
+
+    Args:
+    - questions (List[AbstractQuestion]): The questions to resolve.
+    - on_done (Callable, optional): Called as soon as a question is resolved,
+    whatever its position, with the index of the question, the question and the
+    time spent in seconds (None if resolving it failed).
+
+    Yields:
+    - Tuple[AbstractQuestion, str, float]: The question, its HTML section and
+    the time spent resolving it in seconds.
+    """
+    executor = get_question_executor()
+    futures = [executor.submit(render_question, question) for question in questions]
+    if on_done is not None:
+
+        def notify(index, question, future):
+            elapsed = None
+            if not future.cancelled() and future.exception() is None:
+                elapsed = future.result()[1]
+            on_done(index, question, elapsed)
+
+        for index, (question, future) in enumerate(zip(questions, futures)):
+            future.add_done_callback(functools.partial(notify, index, question))
+    try:
+        for question, future in zip(questions, futures):
+            html, elapsed = future.result()
+            yield question, html, elapsed
+    finally:
+        for future in futures:
+            future.cancel()
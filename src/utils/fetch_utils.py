@@ -0,0 +1,288 @@
+import asyncio
+import atexit
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+import aiohttp
+from langchain.document_loaders import SeleniumURLLoader
+from langchain.schema import Document
+from unstructured.partition.html import partition_html
+from src.utils.cache_utils import DiskCache
+
+
+FETCH_TIMEOUT = float(os.getenv("FETCH_TIMEOUT", "20"))
+FETCH_MAX_CONNECTIONS = int(os.getenv("FETCH_MAX_CONNECTIONS", "20"))
+FETCH_MAX_CONNECTIONS_PER_HOST = int(os.getenv("FETCH_MAX_CONNECTIONS_PER_HOST", "2"))
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "2"))
+BROWSER_WAIT_TIMEOUT = float(os.getenv("BROWSER_WAIT_TIMEOUT", "120"))
+PAGE_CACHE_TTL = float(os.getenv("PAGE_CACHE_TTL_HOURS", "72")) * 3600
+PAGE_CACHE_MAX_BYTES = int(os.getenv("PAGE_CACHE_MAX_MB", "500")) * 1024 * 1024
+# Pages with less extracted text than this are considered rendered by JavaScript
+MIN_TEXT_LENGTH = 200
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36"
+)
+
+
+class BrowserPool:
+    """
+    Small pool of reusable headless browsers, used only for the pages that
+    cannot be read without running their JavaScript.
+    """
+
+    def __init__(self, size=BROWSER_POOL_SIZE, wait_timeout=BROWSER_WAIT_TIMEOUT):
+        """
+        Initializes a BrowserPool object. Browsers are started on first use.
+
+        Args:
+        - size (int): The maximum number of browsers running at once.
+        - wait_timeout (float): The maximum number of seconds waited for a
+        browser when all of them are busy.
+        """
+        self.size = size
+        self.wait_timeout = wait_timeout
+        self._idle = []
+        self._created = 0
+        # Notified when a browser is released or may be created
+        self._available = threading.Condition()
+
+    def _acquire(self):
+        with self._available:
+            if not self._available.wait_for(
+                lambda: self._idle or self._created < self.size, self.wait_timeout
+            ):
+                return None
+            if self._idle:
+                return self._idle.pop()
+            self._created += 1
+        try:
+            return SeleniumURLLoader(urls=[])._get_driver()
+        except Exception:
+            self._discard()
+            raise
+
+    def _release(self, driver):
+        with self._available:
+            self._idle.append(driver)
+            self._available.notify()
+
+    def _quit(self, driver):
+        # The slot is freed even if the browser cannot be quit cleanly
+        try:
+            driver.quit()
+        except Exception as e:
+            print(f"Error quitting a browser: {e!r}")
+        finally:
+            self._discard()
+
+    def _discard(self):
+        # A waiter may now create a replacement browser
+        with self._available:
+            self._created -= 1
+            self._available.notify()
+
+    def get_page_source(self, url) -> Optional[str]:
+        """
+        Loads a page in a browser of the pool.
+
+        Args:
+        - url (str): The url of the page.
+
+        Returns:
+        - str or None: The HTML of the rendered page, or None if it failed or no
+        browser was available in time.
+        """
+        driver = self._acquire()
+        if driver is None:
+            print(f"No browser available to fetch {url}")
+            return None
+        try:
+            driver.get(url)
+            page_source = driver.page_source
+        except Exception as e:
+            # e.g. WebDriverException, or a urllib3 error if the driver died
+            print(f"Error fetching {url} with a browser: {e!r}")
+            # The browser may be in a broken state, it is replaced on next use
+            self._quit(driver)
+            return None
+        self._release(driver)
+        return page_source
+
+    def close(self):
+        """
+        Quits all the idle browsers.
+        """
+        with self._available:
+            drivers, self._idle = self._idle, []
+        for driver in drivers:
+            self._quit(driver)
+
+
+browser_pool = BrowserPool()
+atexit.register(browser_pool.close)
+
+page_cache = DiskCache("pages", ttl=PAGE_CACHE_TTL, max_bytes=PAGE_CACHE_MAX_BYTES)
+# normalized url -> event set once the page being fetched is in the cache
+_pages_in_flight = {}
+_pages_in_flight_lock = threading.Lock()
+
+
+def normalize_url(url):
+    """
+    Normalizes a url so that the different spellings of the same page share
+    a cache entry: lower-case scheme and host, no fragment, no tracking
+    parameters, sorted query and no trailing slash.
+
+    Args:
+    - url (str): The url.
+
+    Returns:
+    - str: The normalized url.
+    """
+    parts = urlsplit(url.strip())
+    query = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_")
+    )
+    return urlunsplit(
+        (
+            parts.scheme.lower(),
+            parts.netloc.lower(),
+            parts.path.rstrip("/"),
+            urlencode(query),
+            "",
+        )
+    )
+
+
+def html_to_text(html):
+    """
+    Extracts the text of an HTML page, the same way SeleniumURLLoader does.
+
+    Args:
+    - html (str): The HTML of the page.
+
+    Returns:
+    - str: The text of the page.
+    """
+    elements = partition_html(text=html)
+    return "\n\n".join([str(el) for el in elements])
+
+
+async def _fetch(session, url):
+    try:
+        async with session.get(url) as response:
+            content_type = response.headers.get("Content-Type", "")
+            if response.status != 200 or "html" not in content_type:
+                return None
+            return await response.text(errors="replace")
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        print(f"Error fetching {url}: {e!r}")
+        return None
+
+
+async def _fetch_all(urls):
+    connector = aiohttp.TCPConnector(
+        limit=FETCH_MAX_CONNECTIONS, limit_per_host=FETCH_MAX_CONNECTIONS_PER_HOST
+    )
+    async with aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=FETCH_TIMEOUT),
+        headers={"User-Agent": USER_AGENT},
+    ) as session:
+        return await asyncio.gather(*[_fetch(session, url) for url in urls])
+
+
+def _to_document(url, html, min_text_length=MIN_TEXT_LENGTH):
+    if not html:
+        return None
+    text = html_to_text(html)
+    if len(text) < min_text_length:
+        return None
+    return Document(page_content=text, metadata={"source": url})
+
+
+def _fetch_documents(urls: List[str]) -> List[Document]:
+    htmls = asyncio.run(_fetch_all(urls))
+    documents = {url: _to_document(url, html) for url, html in zip(urls, htmls)}
+
+    browser_urls = [url for url, document in documents.items() if document is None]
+    if browser_urls:
+        print(f"Fetching {len(browser_urls)} pages with a browser")
+        with ThreadPoolExecutor(max_workers=browser_pool.size) as executor:
+            page_sources = executor.map(browser_pool.get_page_source, browser_urls)
+            for url, html in zip(browser_urls, page_sources):
+                documents[url] = _to_document(url, html, min_text_length=1)
+
+    return [document for document in documents.values() if document is not None]
+
+
+def _cache_documents(documents: List[Document]):
+    for document in documents:
+        page_cache.set(
+            normalize_url(document.metadata["source"]),
+            {"source": document.metadata["source"], "text": document.page_content},
+        )
+
+
+def _get_cached_document(url) -> Optional[Document]:
+    page = page_cache.get(normalize_url(url))
+    if page is None:
+        return None
+    return Document(page_content=page["text"], metadata={"source": page["source"]})
+
+
+def fetch_documents(urls: List[str]) -> List[Document]:
+    """
+    Fetches web pages and extracts their text. Pages already in the page cache
+    are not fetched again, and a page being fetched for another caller is
+    waited for instead of being fetched twice.
+
+    The missing pages are fetched concurrently over HTTP. The pages that cannot
+    be read this way (errors, or too little text as for pages rendered by
+    JavaScript) are then loaded with the browser pool.
+
+    Args:
+    - urls (List[str]): The urls of the pages.
+
+    Returns:
+    - List[Document]: One document per page that could be read, in the order of urls.
+    """
+    unique_urls = {}
+    for url in urls:
+        unique_urls.setdefault(normalize_url(url), url)
+    urls = list(unique_urls.values())
+    documents = {url: _get_cached_document(url) for url in urls}
+
+    to_fetch, to_wait = [], []
+    with _pages_in_flight_lock:
+        for url in urls:
+            if documents[url] is not None:
+                continue
+            key = normalize_url(url)
+            if key in _pages_in_flight:
+                to_wait.append((url, _pages_in_flight[key]))
+            else:
+                _pages_in_flight[key] = threading.Event()
+                to_fetch.append(url)
+
+    try:
+        fetched = _fetch_documents(to_fetch) if to_fetch else []
+        _cache_documents(fetched)
+        for document in fetched:
+            documents[document.metadata["source"]] = document
+    finally:
+        with _pages_in_flight_lock:
+            for url in to_fetch:
+                _pages_in_flight.pop(normalize_url(url)).set()
+
+    for url, event in to_wait:
+        event.wait()
+        documents[url] = _get_cached_document(url)
+
+    print(f"Pages: {len(urls) - len(to_fetch)} from cache, {len(to_fetch)} fetched")
+    return [document for document in documents.values() if document is not None]
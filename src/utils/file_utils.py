@@ -0,0 +1,34 @@
+import io
+import os
+
+
+def to_named_buffer(data, name):
+    """
+    Wraps bytes into an in-memory file carrying a name, as the loaders and
+    questions use the name of their files as source.
+
+    Args:
+    - data (bytes): The content of the file.
+    - name (str): The name of the file.
+
+    Returns:
+    - io.BytesIO: The in-memory file.
+    """
+    buffer = io.BytesIO(data)
+    buffer.name = name
+    return buffer
+
+
+def get_file_name(source):
+    """
+    Returns the name of a file given as a path or as an in-memory file.
+
+    Args:
+    - source (str or io.BytesIO): The path to the file or the named in-memory file.
+
+    Returns:
+    - str: The base name of the file.
+    """
+    if isinstance(source, str):
+        return os.path.basename(source)
+    return os.path.basename(source.name)
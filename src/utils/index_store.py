@@ -0,0 +1,88 @@
+import os
+import pickle
+import shutil
+import tempfile
+import faiss
+from langchain.vectorstores import FAISS
+from src.utils.cache_utils import get_cache_dir
+
+
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "index.pkl"
+
+
+class FaissIndexStore:
+    """
+    Local store of FAISS indexes keyed by the content they were built from.
+    Each index lives in its own directory, in the format of FAISS.save_local.
+    """
+
+    def __init__(self, directory=None):
+        """
+        Initializes a FaissIndexStore object.
+
+        Args:
+        - directory (str, optional): The directory holding the indexes.
+        Defaults to the "faiss" cache directory.
+        """
+        self.directory = directory or get_cache_dir("faiss")
+
+    def load(self, key, embedder):
+        """
+        Loads an index, memory-mapping the FAISS vectors when the index type allows it.
+
+        Args:
+        - key (str): The key of the index.
+        - embedder (Embeddings): The embedder used to embed the queries.
+
+        Returns:
+        - FAISS or None: The index, or None if it was never saved.
+        """
+        path = os.path.join(self.directory, key)
+        if not os.path.exists(os.path.join(path, DOCSTORE_FILE)):
+            return None
+        index_path = os.path.join(path, INDEX_FILE)
+        try:
+            index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP)
+        except RuntimeError:
+            index = faiss.read_index(index_path)
+        with open(os.path.join(path, DOCSTORE_FILE), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        print(f"FAISS index {key} loaded from {path}")
+        return FAISS(embedder.embed_query, index, docstore, index_to_docstore_id)
+
+    def save(self, key, index: FAISS):
+        """
+        Saves an index. The index is written in a temporary directory first so
+        that a concurrent reader never sees a partially written index.
+
+        Args:
+        - key (str): The key of the index.
+        - index (FAISS): The index to save.
+        """
+        path = os.path.join(self.directory, key)
+        tmp_path = tempfile.mkdtemp(dir=self.directory)
+        index.save_local(tmp_path)
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            # The same index has been saved in the meantime
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+    def load_or_build(self, key, embedder, build_index):
+        """
+        Loads an index, or builds and saves it if it was never saved.
+
+        Args:
+        - key (str): The key of the index.
+        - embedder (Embeddings): The embedder used to embed the queries.
+        - build_index (Callable[[], FAISS]): The function building the index.
+
+        Returns:
+        - FAISS: The index.
+        """
+        index = self.load(key, embedder)
+        if index is None:
+            index = build_index()
+            self.save(key, index)
+        return index
@@ -0,0 +1,188 @@
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from src.utils.custom_errors import JobQueueFullError
+
+
+MAX_REPORT_WORKERS = int(os.getenv("MAX_REPORT_WORKERS", "2"))
+MAX_QUEUED_JOBS = int(os.getenv("MAX_QUEUED_JOBS", "20"))
+# Finished jobs are forgotten after this delay
+JOB_RETENTION = float(os.getenv("JOB_RETENTION_HOURS", "24")) * 3600
+
+
+class Job:
+    """
+    Report generation job, with its status and the progress of each question.
+    """
+
+    def __init__(self, company_name):
+        """
+        Initializes a Job object in the "queued" status.
+
+        Args:
+        - company_name (str): The name of the company of the report.
+        """
+        self.id = uuid.uuid4().hex
+        self.company_name = company_name
+        self.status = "queued"
+        self.questions = []
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def set_questions(self, questions):
+        """
+        Registers the questions of the report, all pending.
+
+        Args:
+        - questions (List[AbstractQuestion]): The questions of the report.
+        """
+        with self._lock:
+            self.questions = [
+                {"question": type(question).__name__, "status": "pending"}
+                for question in questions
+            ]
+
+    def start(self):
+        """
+        Marks the job as running.
+        """
+        with self._lock:
+            self.status = "running"
+            self.started_at = time.time()
+
+    def finish(self, result=None, error=None):
+        """
+        Marks the job as done, or as failed if an error is given.
+
+        Args:
+        - result (str, optional): The name of the result.
+        - error (str, optional): The error message.
+        """
+        with self._lock:
+            self.result = result
+            self.error = error
+            self.status = "done" if error is None else "error"
+            self.finished_at = time.time()
+
+    def on_question_done(self, index, question, elapsed):
+        """
+        Marks a question as resolved. Meant to be given to build_report.
+
+        Args:
+        - index (int): The index of the question in the report.
+        - question (AbstractQuestion): The question.
+        - elapsed (float or None): The time spent in seconds, None if it failed.
+        """
+        with self._lock:
+            if elapsed is None:
+                self.questions[index]["status"] = "error"
+            else:
+                self.questions[index]["status"] = "done"
+                self.questions[index]["seconds"] = round(elapsed, 1)
+
+    def to_dict(self):
+        """
+        Returns the state of the job.
+
+        Returns:
+        - dict: The JSON serializable state of the job.
+        """
+        with self._lock:
+            done = sum(question["status"] != "pending" for question in self.questions)
+            return {
+                "job_id": self.id,
+                "company_name": self.company_name,
+                "status": self.status,
+                "progress": f"{done}/{len(self.questions)}",
+                "questions": [dict(question) for question in self.questions],
+                "filename": self.result,
+                "error": self.error,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+            }
+
+
+class JobManager:
+    """
+    Runs report generation jobs on a bounded pool of workers.
+    Jobs wait in a queue of bounded depth until a worker is free.
+    """
+
+    def __init__(self, max_workers=MAX_REPORT_WORKERS, max_queued=MAX_QUEUED_JOBS):
+        """
+        Initializes a JobManager object.
+
+        Args:
+        - max_workers (int): The number of reports generated at the same time.
+        - max_queued (int): The maximum number of jobs waiting for a worker.
+        """
+        self.max_queued = max_queued
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="report"
+        )
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, company_name, run):
+        """
+        Queues a job.
+
+        Args:
+        - company_name (str): The name of the company of the report.
+        - run (Callable[[Job], str]): The function generating the report, returning
+        the name of the result.
+
+        Returns:
+        - Job: The queued job.
+
+        Raises:
+        - JobQueueFullError: If too many jobs are already waiting.
+        """
+        with self._lock:
+            self._forget_old_jobs()
+            queued = sum(job.status == "queued" for job in self._jobs.values())
+            if queued >= self.max_queued:
+                raise JobQueueFullError(
+                    f"{queued} reports are already waiting, please retry later"
+                )
+            job = Job(company_name)
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, run)
+        return job
+
+    def get(self, job_id):
+        """
+        Retrieves a job.
+
+        Args:
+        - job_id (str): The id of the job.
+
+        Returns:
+        - Job or None: The job, or None if it is unknown.
+        """
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job, run):
+        job.start()
+        try:
+            result = run(job)
+        except Exception as e:
+            traceback.print_exc()
+            job.finish(error=str(e))
+        else:
+            job.finish(result=result)
+
+    def _forget_old_jobs(self):
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_at is not None and now - job.finished_at > JOB_RETENTION:
+                del self._jobs[job_id]
@@ -0,0 +1,76 @@
+import json
+import os
+import re
+from typing import Optional
+from langchain.cache import BaseCache
+from langchain.load.dump import dumps
+from langchain.load.load import loads
+from src.utils.cache_utils import DiskCache
+
+
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL_DAYS", "30")) * 24 * 3600
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_MB", "200")) * 1024 * 1024
+
+
+class DiskLLMCache(BaseCache):
+    """
+    LangChain LLM cache persisting the LLM responses on disk.
+
+    Entries are keyed by the LLM parameters (model, deployment, temperature...)
+    and the full rendered prompt, which includes the retrieved `summaries`.
+    Only deterministic calls (temperature 0, as in create_llm and
+    create_llm_gpt4) are cached, since only exact repeats of those are safe
+    to serve.
+    """
+
+    def __init__(self):
+        self.cache = DiskCache(
+            "llm", ttl=LLM_CACHE_TTL, max_bytes=LLM_CACHE_MAX_BYTES
+        )
+
+    @staticmethod
+    def _is_deterministic(llm_string):
+        """
+        Checks whether the LLM of a cache key is called with temperature 0.
+
+        Args:
+        - llm_string (str): The LLM parameters given by LangChain: the serialized
+        LLM followed by "---" and the call parameters for serializable LLMs
+        (as AzureChatOpenAI), the sorted parameters otherwise.
+
+        Returns:
+        - bool: True if the temperature is 0.
+        """
+        serialized, separator, _ = llm_string.rpartition("---")
+        if separator:
+            try:
+                llm = json.loads(serialized)
+            except ValueError:
+                return False
+            if not isinstance(llm, dict):
+                return False
+            return llm.get("kwargs", {}).get("temperature") == 0
+        return re.search(r"\('temperature', 0(\.0)?\)", llm_string) is not None
+
+    @staticmethod
+    def _key(prompt, llm_string):
+        return llm_string + "\n" + prompt
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[list]:
+        if not self._is_deterministic(llm_string):
+            return None
+        generations = self.cache.get(self._key(prompt, llm_string))
+        if generations is None:
+            return None
+        return [loads(generation) for generation in generations]
+
+    def update(self, prompt: str, llm_string: str, return_val: list) -> None:
+        if not self._is_deterministic(llm_string):
+            return
+        self.cache.set(
+            self._key(prompt, llm_string),
+            [dumps(generation) for generation in return_val],
+        )
+
+    def clear(self, **kwargs) -> None:
+        self.cache.clear()
@@ -1,8 +1,41 @@
+import functools
+import langchain
 from langchain.chat_models import AzureChatOpenAI
 from langchain.embeddings.openai import OpenAIEmbeddings
+from src.utils.embedding_utils import (
+    EMBED_BATCH_SIZE,
+    BatchedEmbeddings,
+    CachedEmbeddings,
+)
+from src.utils.llm_cache import DiskLLMCache
+from src.utils.rate_limit_utils import (
+    LLM_COMPLETION_TOKENS,
+    OPENAI_MAX_RETRIES,
+    estimate_tokens,
+    get_rate_limiter,
+)
 import json
 import os
 
+langchain.llm_cache = DiskLLMCache()
+
+
+class RateLimitedAzureChatOpenAI(AzureChatOpenAI):
+    """
+    AzureChatOpenAI sending its requests through the process-wide rate limiter of
+    its deployment, which also retries the throttled or failed requests.
+    """
+
+    def completion_with_retry(self, run_manager=None, **kwargs):
+        # Azure counts the prompt and the requested completion against the quota
+        tokens = sum(
+            estimate_tokens(message.get("content") or "") + 4
+            for message in kwargs.get("messages", [])
+        ) + (kwargs.get("max_tokens") or LLM_COMPLETION_TOKENS)
+        return get_rate_limiter(self.deployment_name).call(
+            lambda: self.client.create(**kwargs), tokens, max_retries=self.max_retries
+        )
+
 
 def create_embedding():
     json_path = os.path.join(os.getcwd(), "credentials", "credentials.json")
@@ -15,18 +48,26 @@ def create_embedding():
     EMBED_API_KEY = credentials.get("EMBED_API_KEY")
     EMBED_MODEL_NAME = credentials.get("EMBED_MODEL_NAME")
 
-    return OpenAIEmbeddings(
+    embedder = OpenAIEmbeddings(
         model=EMBED_MODEL_NAME,
         deployment=EMBED_DEPLOYMENT_NAME,
         openai_api_version=OPENAI_API_VERSION,
         openai_api_base=EMBED_BASE_URL,
         openai_api_type=OPENAI_API_TYPE,
         openai_api_key=EMBED_API_KEY,
-        chunk_size=1,
+        chunk_size=EMBED_BATCH_SIZE,
         request_timeout=120,
+        # A single attempt, BatchedEmbeddings retries through the rate limiter
+        max_retries=1,
+    )
+    return CachedEmbeddings(
+        BatchedEmbeddings(embedder, EMBED_DEPLOYMENT_NAME),
+        model_name=f"{EMBED_MODEL_NAME}_{EMBED_DEPLOYMENT_NAME}",
     )
 
 
+# Clients are created once per process and shared by all the questions and reports
+@functools.lru_cache(maxsize=None)
 def create_llm():
     json_path = os.path.join(os.getcwd(), "credentials", "credentials.json")
     credentials = json.load(open(json_path))
@@ -37,7 +78,7 @@ def create_llm():
     OPENAI_API_TYPE = credentials.get("OPENAI_API_TYPE")
     OPENAI_API_VERSION = credentials.get("OPENAI_API_VERSION")
 
-    return AzureChatOpenAI(
+    return RateLimitedAzureChatOpenAI(
         model_name="gpt-35-turbo-16k",
         openai_api_base=BASE_URL,
         openai_api_version=OPENAI_API_VERSION,
@@ -46,9 +87,11 @@ def create_llm():
         openai_api_type=OPENAI_API_TYPE,
         temperature=0,
         request_timeout=120,
+        max_retries=OPENAI_MAX_RETRIES,
     )
 
 
+@functools.lru_cache(maxsize=None)
 def create_llm_gpt4():
     json_path = os.path.join(os.getcwd(), "credentials", "credentials.json")
     credentials = json.load(open(json_path))
@@ -58,7 +101,7 @@ def create_llm_gpt4():
     OPENAI_API_TYPE = credentials.get("OPENAI_API_TYPE")
     OPENAI_API_VERSION = credentials.get("OPENAI_API_VERSION")
 
-    return AzureChatOpenAI(
+    return RateLimitedAzureChatOpenAI(
         model_name="gpt-4",
         openai_api_base=BASE_URL,
         openai_api_version=OPENAI_API_VERSION,
@@ -67,4 +110,5 @@ def create_llm_gpt4():
         openai_api_type=OPENAI_API_TYPE,
         temperature=0,
         request_timeout=120,
+        max_retries=OPENAI_MAX_RETRIES,
     )
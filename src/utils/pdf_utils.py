@@ -0,0 +1,143 @@
+import functools
+import io
+import os
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, List, Optional
+import pypdf
+from langchain.schema import Document
+from src.utils.cache_utils import DiskCache, hash_file
+from src.utils.concurrency_utils import (
+    SingleFlight,
+    discard_process_pool,
+    get_process_pool,
+)
+
+
+PDF_PARSE_WORKERS = int(os.getenv("PDF_PARSE_WORKERS", str(os.cpu_count() or 1)))
+# Minimum number of pages parsed by each worker process
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_MB", "500")) * 1024 * 1024
+
+page_cache = DiskCache("pdf_pages", max_bytes=PDF_CACHE_MAX_BYTES)
+chunk_cache = DiskCache("pdf_chunks", max_bytes=PDF_CACHE_MAX_BYTES)
+_parses = SingleFlight()
+
+
+def _read_bytes(source) -> bytes:
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            return f.read()
+    return source.getvalue()
+
+
+def _extract_pages(data: bytes, start: int, end: int) -> List[str]:
+    reader = pypdf.PdfReader(io.BytesIO(data))
+    return [reader.pages[number].extract_text() for number in range(start, end)]
+
+
+def _parse_pages(data: bytes) -> List[str]:
+    """
+    Extracts the text of each page of a PDF document, splitting the pages into
+    ranges parsed in the shared process pool.
+
+    Args:
+    - data (bytes): The content of the PDF document.
+
+    Returns:
+    - List[str]: The text of each page.
+    """
+    page_count = len(pypdf.PdfReader(io.BytesIO(data)).pages)
+    if page_count < 2 * PDF_PAGES_PER_TASK or PDF_PARSE_WORKERS <= 1:
+        return _extract_pages(data, 0, page_count)
+
+    range_count = min(PDF_PARSE_WORKERS, page_count // PDF_PAGES_PER_TASK)
+    range_size = -(-page_count // range_count)
+    starts = range(0, page_count, range_size)
+    ends = [min(start + range_size, page_count) for start in starts]
+    pool = get_process_pool("pdf", PDF_PARSE_WORKERS)
+    try:
+        ranges = pool.map(functools.partial(_extract_pages, data), starts, ends)
+        return [text for pages in ranges for text in pages]
+    except BrokenProcessPool:
+        discard_process_pool("pdf")
+        raise
+
+
+def load_pdf_pages(source, content_hash: Optional[str] = None) -> List[str]:
+    """
+    Returns the text of each page of a PDF document. The pages are parsed once
+    per document content and then read from the page cache.
+
+    Args:
+    - source (str or io.BytesIO): The path to the PDF document or the in-memory file.
+    - content_hash (str, optional): The hash of the content, see hash_file.
+    Computed if not given.
+
+    Returns:
+    - List[str]: The text of each page.
+    """
+    content_hash = content_hash or hash_file(source)
+
+    def parse():
+        pages = page_cache.get(content_hash)
+        if pages is None:
+            pages = _parse_pages(_read_bytes(source))
+            page_cache.set(content_hash, pages)
+            print(f"Parsed {len(pages)} PDF pages")
+        return pages
+
+    return _parses.do(("pages", content_hash), parse)
+
+
+def load_pdf_chunks(
+    source,
+    source_name: str,
+    split_documents: Callable[[List[Document]], List[Document]],
+    version: str,
+    content_hash: Optional[str] = None,
+) -> List[Document]:
+    """
+    Returns the chunks of a PDF document. The pages are split once per document
+    content and way of splitting, then read from the chunk cache.
+
+    Args:
+    - source (str or io.BytesIO): The path to the PDF document or the in-memory file.
+    - source_name (str): The source written in the metadata of the chunks.
+    - split_documents (Callable): Splits the pages (one document per page, with
+    its "page" number in metadata) into chunks with JSON serializable metadata.
+    - version (str): Identifies the way of splitting, change it when
+    split_documents changes.
+    - content_hash (str, optional): The hash of the content, see hash_file.
+    Computed if not given.
+
+    Returns:
+    - List[Document]: The chunks, with their source and content_hash in metadata.
+    """
+    content_hash = content_hash or hash_file(source)
+    key = f"{version} {content_hash}"
+
+    def split():
+        chunks = chunk_cache.get(key)
+        if chunks is None:
+            pages = [
+                Document(page_content=text, metadata={"page": number})
+                for number, text in enumerate(load_pdf_pages(source, content_hash))
+            ]
+            chunks = [
+                {"text": chunk.page_content, "metadata": chunk.metadata}
+                for chunk in split_documents(pages)
+            ]
+            chunk_cache.set(key, chunks)
+        return chunks
+
+    return [
+        Document(
+            page_content=chunk["text"],
+            metadata={
+                **chunk["metadata"],
+                "source": source_name,
+                "content_hash": content_hash,
+            },
+        )
+        for chunk in _parses.do(("chunks", key), split)
+    ]
@@ -11,6 +11,7 @@ from src.questions.general_information_question import GeneralInformationQuestio
 from src.questions.financials.key_financials import MultipleFinancialIndicatorsQuestions
 from src.questions.people.management_team_question import ManagementTeamQuestion
 from src.questions.parent_company import ParentCompanyQuestion
+from src.questions.question_batch import batch_questions
 from src.questions.people.people_with_linkedIn_question import QuestionWithLinkedin
 from src.questions.competitors_question import CompetitorsQuestion
 from src.questions.major_announcements_question import MajorAnnouncementQuestion
@@ -18,8 +19,15 @@ from src.questions.media_review_question import MediaReviewQuestion
 from src.questions.spendcube.spendcube_analysis import SpendCubeQuestion
 from src.questions.scandals_or_legal_issues_question import ScandalsQuestion
 from src.document_loaders.pdf_loader import PdfLoader
+from src.utils.execution_utils import run_questions
+from src.utils.spendcube_utils import (
+    concat_frames,
+    filter_by_company_name,
+    filter_by_entities,
+    map_spendcube_files,
+)
+from html import escape
 from typing import List
-import pandas as pd
 
 
 def generate_list_of_questions(company_name, pdf_path, csv_path):
@@ -28,8 +36,10 @@ def generate_list_of_questions(company_name, pdf_path, csv_path):
 
     Args:
     - company_name (str): The name of the company.
-    - pdf_path (str): The path to the Factiva file.
-    - csv_path (str): The path to the Spendcube file.
+    - pdf_path (str or io.BytesIO): The path to the Factiva file,
+    or the named in-memory file.
+    - csv_path (str or io.BytesIO): The path to the Spendcube file,
+    or the named in-memory file.
 
     Returns:
     - List[Question]: A list of different question instances.
@@ -39,6 +49,28 @@ def generate_list_of_questions(company_name, pdf_path, csv_path):
     question_bs = FinancialIndicatorQuestionBS(company_name, factiva_loader)
     board = BoardMembersQuestion(company_name, factiva_loader)
     management = ManagementTeamQuestion(company_name, factiva_loader)
+    general_information = GeneralInformationQuestion(company_name, factiva_loader)
+    clients = ClientsQuestion(company_name, factiva_loader)
+    location = BuisnessLocationQuestion(company_name, factiva_loader)
+    parent_company = ParentCompanyQuestion(company_name, factiva_loader)
+    competitors = CompetitorsQuestion(company_name, factiva_loader)
+    general_financial_information = GeneralFinancialInformationQuestion(
+        company_name, factiva_loader
+    )
+    # The questions on the Factiva report are answered a few at a time. The
+    # financial statements are not, as they are read from their tables first.
+    batch_questions(
+        [
+            general_information,
+            clients,
+            location,
+            parent_company,
+            competitors,
+            general_financial_information,
+            board,
+            management,
+        ]
+    )
     return [
         SpendCubeQuestion(
             company_name,
@@ -47,19 +79,19 @@ def generate_list_of_questions(company_name, pdf_path, csv_path):
         MediaReviewQuestion(company_name),
         MajorAnnouncementQuestion(company_name),
         ScandalsQuestion(company_name),
-        GeneralInformationQuestion(company_name, factiva_loader),
+        general_information,
         QuestionWithLinkedin(company_name, board, management),
-        ClientsQuestion(company_name, factiva_loader),
-        BuisnessLocationQuestion(company_name, factiva_loader),
-        ParentCompanyQuestion(company_name, factiva_loader),
-        CompetitorsQuestion(company_name, factiva_loader),
+        clients,
+        location,
+        parent_company,
+        competitors,
         MultipleFinancialIndicatorsQuestions(
             company_name,
             question_is,
             question_bs,
             pdf_path=pdf_path,
         ),
-        GeneralFinancialInformationQuestion(company_name, factiva_loader),
+        general_financial_information,
     ]
 
 
@@ -69,8 +101,10 @@ def generate_small_list_of_questions(company_name, pdf_path, csv_path):
 
     Args:
     - company_name (str): The name of the company.
-    - pdf_path (str): The path to the PDF file.
-    - csv_path (str): The path to the CSV file.
+    - pdf_path (str or io.BytesIO): The path to the PDF file,
+    or the named in-memory file.
+    - csv_path (str or io.BytesIO): The path to the CSV file,
+    or the named in-memory file.
 
     Returns:
     - List[Question]: A smaller list of question instances.
@@ -93,71 +127,134 @@ def generate_small_list_of_questions(company_name, pdf_path, csv_path):
     ]
 
 
-def build_report(questions: List[QuestionWithLLM], company_name, html_file):
+def report_header(company_name):
+    """
+    Build the beginning of the HTML report.
+
+    Args:
+    - company_name (str): The name of the company.
+
+    Returns:
+    - str: The HTML header of the report.
+    """
+    return (
+        "<html>\n<body>\n"
+        + '<h1 style="color: #003883;">'
+        + "Market Research on "
+        + company_name
+        + "</h1>\n"
+    )
+
+
+def report_error_section(error):
+    """
+    Build the last section of a report whose generation failed, e.g. while it
+    was streamed.
+
+    Args:
+    - error (Exception): The error.
+
+    Returns:
+    - str: The HTML section telling that the report is incomplete.
+    """
+    return (
+        '<h2 style="color: #d30473;font-size: 130%;">'
+        + "The report could not be completed"
+        + "</h2>\n"
+        + '<h4 style="color: #223349;font-size: 110%;">'
+        + escape(str(error) or type(error).__name__)
+        + "</h4>\n"
+    )
+
+
+def iter_report_sections(questions: List[QuestionWithLLM], on_question_done=None):
+    """
+    Resolve the questions concurrently and yield their HTML sections in the order
+    of the list, each one as soon as it and all the previous ones are resolved.
+
+    Args:
+    - questions (List[QuestionWithLLM]): A list of questions.
+    - on_question_done (Callable, optional): Called when each question is resolved,
+    see run_questions.
+
+    Yields:
+    - Tuple[str, str, float]: The name of the question, its HTML section and the
+    time in seconds spent resolving it.
+    """
+    for question, html, elapsed in run_questions(questions, on_question_done):
+        print(f"{type(question).__name__} resolved in {elapsed:.1f}s")
+        yield type(question).__name__, html, elapsed
+
+
+def build_report(
+    questions: List[QuestionWithLLM], company_name, html_file, on_question_done=None
+):
     """
     Build an HTML report using a list of questions.
+    The questions are resolved concurrently and written in their original order.
 
     Args:
     - questions (List[QuestionWithLLM]): A list of questions.
     - company_name (str): The name of the company.
-    - html_file (str): The path to the HTML file to be created.
+    - html_file (str or file object): The path to the HTML file to be created,
+    or a text file object to write the report into.
+    - on_question_done (Callable, optional): Called when each question is resolved,
+    see run_questions.
+
+    Returns:
+    - List[Tuple[str, float]]: The name of each question with the time in seconds
+    spent resolving it, in the order of the report.
     """
-    html_file_path = html_file
-    with open(html_file_path, "w") as html_file:
-        html_file.write("<html>\n<body>\n")
-        html_file.write(
-            '<h1 style="color: #003883;">'
-            + "Market Research on "
-            + company_name
-            + "</h1>\n"
-        )
-        for question in questions:
-            question.write(html_file)
+    if isinstance(html_file, str):
+        with open(html_file, "w") as f:
+            return build_report(questions, company_name, f, on_question_done)
+
+    timings = []
+    html_file.write(report_header(company_name))
+    for name, html, elapsed in iter_report_sections(questions, on_question_done):
+        html_file.write(html)
+        timings.append((name, elapsed))
+    return timings
 
 
 def aggregate_spendcube_files_and_get_all_vendors_names(paths, company_name):
     """
     Aggregate SpendCube files and get a list of unique vendor names related to a company.
+    The files are parsed and filtered in parallel, one per process, and vendors are
+    matched on the distinct supplier names only.
 
     Args:
-    - paths (List[str]): List of file paths.
+    - paths (List[str or io.BytesIO]): File paths or in-memory files.
     - company_name (str): The name of the company.
 
     Returns:
-    - Tuple[pd.DataFrame, List[str]]: A tuple containing aggregated data and a list of unique vendor names.
-    """
-    data = pd.DataFrame()
-    for path in paths:
-        yearly_data = pd.read_excel(path, engine="openpyxl")
-        regex_pattern = rf"\b{company_name}\b"
-        filtered_data = yearly_data[
-            yearly_data["supplier_name"].str.contains(
-                regex_pattern, case=False, regex=True
-            )
-        ]
-        data = pd.concat([data, filtered_data])
+    - Tuple[pd.DataFrame, List[str], List[str]]: A tuple containing aggregated data,
+    a list of unique vendor names, and a list of close vendor names which were not
+    selected (e.g. misspelled), as suggestions.
+    """
+    results = map_spendcube_files(filter_by_company_name, paths, company_name)
+    data = concat_frames([filtered_data for filtered_data, _ in results])
     unique_values_list = data["supplier_name"].unique().tolist()
-    return data, unique_values_list
+    suggestions = []
+    for _, yearly_suggestions in results:
+        for name in yearly_suggestions:
+            if name not in unique_values_list and name not in suggestions:
+                suggestions.append(name)
+    return data, unique_values_list, suggestions
 
 
 def aggregate_spendcube_files(paths, list_of_entities):
     """
     Aggregate SpendCube files given a list of entities.
+    The files are parsed and filtered in parallel, one per process.
 
     Args:
-    - paths (List[str]): List of file paths.
+    - paths (List[str or io.BytesIO]): File paths or in-memory files.
     - list_of_entities (List[str]): List of entities to filter SpendCube data.
 
     Returns:
     - pd.DataFrame: Aggregated data based on the provided entities.
     """
-    data = pd.DataFrame()
-    for path in paths:
-        yearly_data = pd.read_excel(path, engine="openpyxl")
-        filtered_data = yearly_data[
-            yearly_data["supplier_name"]
-            .str.lower()
-            .isin(map(str.lower, list_of_entities))
-        ]
-        data = pd.concat([data, filtered_data])
-    return data
+    return concat_frames(
+        map_spendcube_files(filter_by_entities, paths, list_of_entities)
+    )
@@ -0,0 +1,351 @@
+import functools
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+import openai
+import tiktoken
+
+
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "300"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "120000"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# Tokens reserved for the completion when a call does not set max_tokens
+LLM_COMPLETION_TOKENS = int(os.getenv("LLM_COMPLETION_TOKENS", "1000"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "6"))
+# The concurrency is reduced when the latency per token exceeds this multiple of
+# the best latency per token observed
+LATENCY_TOLERANCE = 2.0
+LATENCY_SMOOTHING = 0.2
+
+# Errors worth retrying, the call may succeed later
+RETRYABLE_ERRORS = (
+    openai.error.RateLimitError,
+    openai.error.Timeout,
+    openai.error.APIError,
+    openai.error.APIConnectionError,
+    openai.error.ServiceUnavailableError,
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _get_encoding():
+    return tiktoken.get_encoding("cl100k_base")
+
+
+def estimate_tokens(text) -> int:
+    """
+    Counts the tokens of a text for the OpenAI models.
+
+    Args:
+    - text (str): The text.
+
+    Returns:
+    - int: The number of tokens.
+    """
+    return len(_get_encoding().encode(text, disallowed_special=()))
+
+
+class TokenBucket:
+    """
+    Bucket refilled continuously at `per_minute` units per minute, holding at
+    most one minute of units. Units can be borrowed: the caller is then told
+    how long to wait for the bucket to be refilled.
+    """
+
+    def __init__(self, per_minute: float):
+        """
+        Initializes a full TokenBucket object.
+
+        Args:
+        - per_minute (float): The number of units per minute. A value of 0
+        disables the limit.
+        """
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self._available = per_minute
+        self._updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._available = min(
+            self.capacity, self._available + (now - self._updated_at) * self.rate
+        )
+        self._updated_at = now
+
+    def reserve(self, amount: float) -> float:
+        """
+        Takes units from the bucket. Not thread-safe, the caller holds a lock.
+
+        Args:
+        - amount (float): The number of units, capped to the capacity.
+
+        Returns:
+        - float: The time in seconds to wait before using the units.
+        """
+        if not self.rate:
+            return 0.0
+        self._refill()
+        self._available -= min(amount, self.capacity)
+        return max(0.0, -self._available / self.rate)
+
+    def give_back(self, amount: float):
+        """
+        Returns units which were reserved but not used (or takes more units
+        if the amount is negative).
+
+        Args:
+        - amount (float): The number of units.
+        """
+        if self.rate:
+            self._refill()
+            self._available = min(self.capacity, self._available + amount)
+
+    def available(self) -> float:
+        self._refill()
+        return self._available
+
+
+class DeploymentRateLimiter:
+    """
+    Limits the calls to one Azure OpenAI deployment: requests per minute and
+    tokens per minute (token buckets), and concurrent calls.
+
+    The number of concurrent calls adapts to the feedback of the deployment: it is
+    halved, and calls are paused, when the deployment answers 429 (too many
+    requests) or when its latency degrades, and it grows back by one after a run of
+    calls without throttling.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: float,
+        tokens_per_minute: float,
+        max_concurrency: int,
+    ):
+        """
+        Initializes a DeploymentRateLimiter object.
+
+        Args:
+        - name (str): The name of the deployment.
+        - requests_per_minute (float): The quota of requests per minute.
+        - tokens_per_minute (float): The quota of tokens per minute.
+        - max_concurrency (int): The maximum number of concurrent calls.
+        """
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.concurrency = float(max_concurrency)
+        self.in_flight = 0
+        self.calls = 0
+        self.throttled = 0
+        self.latency = None
+        self.best_latency = None
+        self._paused_until = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self, tokens: int):
+        """
+        Blocks until a call using `tokens` tokens is allowed to start.
+        Must be followed by release.
+
+        Args:
+        - tokens (int): The estimated number of tokens of the call.
+        """
+        with self._condition:
+            while True:
+                pause = self._paused_until - time.monotonic()
+                if pause <= 0 and self.in_flight < int(self.concurrency):
+                    break
+                self._condition.wait(timeout=pause if pause > 0 else None)
+            self.in_flight += 1
+            wait = max(self.requests.reserve(1), self.tokens.reserve(tokens))
+        if wait > 0:
+            time.sleep(wait)
+
+    def release(
+        self,
+        latency: Optional[float] = None,
+        estimated_tokens: int = 0,
+        used_tokens: Optional[int] = None,
+        retry_after: Optional[float] = None,
+    ):
+        """
+        Ends a call and adapts the concurrency to its outcome.
+
+        Args:
+        - latency (float, optional): The duration of the call in seconds, None
+        if it failed or was throttled.
+        - estimated_tokens (int): The number of tokens given to acquire.
+        - used_tokens (int, optional): The number of tokens actually used,
+        to correct the estimate.
+        - retry_after (float, optional): Set if the call was throttled, the time
+        in seconds to wait before calling the deployment again.
+        """
+        with self._condition:
+            self.in_flight -= 1
+            self.calls += 1
+            if used_tokens is not None:
+                self.tokens.give_back(estimated_tokens - used_tokens)
+            if retry_after is not None:
+                self.throttled += 1
+                now = time.monotonic()
+                # Only the first 429 of a burst reduces the concurrency
+                if now >= self._paused_until:
+                    self._decrease()
+                self._paused_until = max(self._paused_until, now + retry_after)
+            elif latency is not None:
+                # Normalized by the size of the call, as long calls are slower
+                tokens = max(1, used_tokens or estimated_tokens)
+                self._observe_latency(latency * 1000 / tokens)
+            self._condition.notify_all()
+
+    def _decrease(self):
+        self.concurrency = max(1.0, self.concurrency / 2)
+
+    def _observe_latency(self, latency):
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += LATENCY_SMOOTHING * (latency - self.latency)
+        if self.best_latency is None or self.latency < self.best_latency:
+            self.best_latency = self.latency
+
+        if self.latency > LATENCY_TOLERANCE * self.best_latency:
+            self._decrease()
+            # Start measuring again from the reduced load
+            self.best_latency = self.latency
+        else:
+            self.concurrency = min(
+                self.max_concurrency, self.concurrency + 1 / self.concurrency
+            )
+
+    def call(self, fn: Callable, tokens: int, max_retries=OPENAI_MAX_RETRIES):
+        """
+        Calls the deployment within the limits, retrying with backoff when the
+        deployment is throttling or unavailable.
+
+        Args:
+        - fn (Callable): The function sending the request.
+        - tokens (int): The estimated number of tokens of the request.
+        - max_retries (int): The number of retries before giving up.
+
+        Returns:
+        - The result of fn.
+        """
+        for attempt in range(max_retries + 1):
+            self.acquire(tokens)
+            start = time.monotonic()
+            try:
+                result = fn()
+            except RETRYABLE_ERRORS as e:
+                backoff = min(60.0, 2.0**attempt)
+                if isinstance(e, openai.error.RateLimitError):
+                    self.release(
+                        estimated_tokens=tokens,
+                        retry_after=_get_retry_after(e) or backoff,
+                    )
+                else:
+                    self.release()
+                if attempt == max_retries:
+                    raise
+                print(f"{self.name}: {e!r}, retry {attempt + 1}/{max_retries}")
+                if not isinstance(e, openai.error.RateLimitError):
+                    time.sleep(backoff)
+                continue
+            except BaseException:
+                self.release()
+                raise
+            self.release(
+                latency=time.monotonic() - start,
+                estimated_tokens=tokens,
+                used_tokens=_get_used_tokens(result),
+            )
+            return result
+
+    def state(self) -> Dict:
+        """
+        Returns the current state of the limiter.
+
+        Returns:
+        - dict: The JSON serializable state.
+        """
+        with self._condition:
+            return {
+                "concurrency": int(self.concurrency),
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self.in_flight,
+                "requests_available": round(self.requests.available(), 1),
+                "tokens_available": round(self.tokens.available()),
+                "paused_for": round(max(0.0, self._paused_until - time.monotonic()), 1),
+                "calls": self.calls,
+                "throttled": self.throttled,
+                "seconds_per_1k_tokens": (
+                    None if self.latency is None else round(self.latency, 3)
+                ),
+            }
+
+
+def _get_retry_after(error) -> Optional[float]:
+    headers = getattr(error, "headers", None) or {}
+    for header in ["retry-after-ms", "retry-after"]:
+        value = headers.get(header)
+        if value is not None:
+            try:
+                seconds = float(value)
+            except ValueError:
+                continue
+            return seconds / 1000 if header.endswith("-ms") else seconds
+    return None
+
+
+def _get_used_tokens(response) -> Optional[int]:
+    try:
+        return response["usage"]["total_tokens"]
+    except (KeyError, TypeError):
+        return None
+
+
+_limiters: Dict[str, DeploymentRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(
+    name,
+    requests_per_minute=LLM_REQUESTS_PER_MINUTE,
+    tokens_per_minute=LLM_TOKENS_PER_MINUTE,
+    max_concurrency=LLM_MAX_CONCURRENCY,
+) -> DeploymentRateLimiter:
+    """
+    Returns the process-wide limiter of a deployment, creating it on first use
+    with the given quotas.
+
+    Args:
+    - name (str): The name of the deployment.
+    - requests_per_minute (float): The quota of requests per minute.
+    - tokens_per_minute (float): The quota of tokens per minute.
+    - max_concurrency (int): The maximum number of concurrent calls.
+
+    Returns:
+    - DeploymentRateLimiter: The limiter shared by all the users of the deployment.
+    """
+    with _limiters_lock:
+        if name not in _limiters:
+            _limiters[name] = DeploymentRateLimiter(
+                name, requests_per_minute, tokens_per_minute, max_concurrency
+            )
+        return _limiters[name]
+
+
+def rate_limits_state() -> Dict[str, Dict]:
+    """
+    Returns the current state of the limiter of each deployment.
+
+    Returns:
+    - dict: The state of each limiter, by deployment name.
+    """
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.name: limiter.state() for limiter in limiters}
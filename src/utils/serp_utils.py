@@ -1,14 +1,69 @@
 from langchain.utilities import SerpAPIWrapper
 from langchain.utilities import GoogleSerperAPIWrapper
+from src.utils.cache_utils import DiskCache
 import json
 import os
 
 
+SERP_CACHE_TTL = float(os.getenv("SERP_CACHE_TTL_HOURS", "24")) * 3600
+SERP_CACHE_MAX_BYTES = int(os.getenv("SERP_CACHE_MAX_MB", "100")) * 1024 * 1024
+
+
+class CachedSearch:
+    """
+    Wrapper around SerpAPIWrapper caching the search results on disk,
+    keyed by the normalized query.
+    """
+
+    def __init__(self, search: SerpAPIWrapper):
+        """
+        Initializes a CachedSearch object.
+
+        Args:
+        - search (SerpAPIWrapper): The search engine called on cache misses.
+        """
+        self.search = search
+        self.cache = DiskCache(
+            "serp", ttl=SERP_CACHE_TTL, max_bytes=SERP_CACHE_MAX_BYTES
+        )
+
+    @staticmethod
+    def _normalize_query(query):
+        return " ".join(query.lower().split())
+
+    def results(self, query):
+        """
+        Returns the search results of a query, from the cache when possible.
+
+        Args:
+        - query (str): The search query.
+
+        Returns:
+        - dict: The raw search results.
+        """
+        key = self._normalize_query(query)
+        results = self.cache.get(key)
+        if results is None:
+            results = self.search.results(query)
+            if "error" not in results:
+                self.cache.set(key, results)
+        return results
+
+    def stats(self):
+        """
+        Returns the hit/miss counters of the search cache.
+
+        Returns:
+        - dict: The statistics of the cache.
+        """
+        return self.cache.stats()
+
+
 def create_search():
     json_path = os.path.join(os.getcwd(), "credentials", "credentials.json")
     credentials = json.load(open(json_path))
     SERPAPI_API_KEY = credentials.get("SERPAPI_API_KEY")
-    return SerpAPIWrapper(serpapi_api_key=SERPAPI_API_KEY)
+    return CachedSearch(SerpAPIWrapper(serpapi_api_key=SERPAPI_API_KEY))
 
 
 def create_search_serper():
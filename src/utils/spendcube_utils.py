@@ -0,0 +1,502 @@
+import functools
+import io
+import os
+import re
+import tempfile
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, List, Optional
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz, process
+from src.utils.cache_utils import get_cache_dir, hash_text
+from src.utils.concurrency_utils import (
+    SingleFlight,
+    discard_process_pool,
+    get_process_pool,
+)
+
+
+SPENDCUBE_PARSE_WORKERS = int(
+    os.getenv("SPENDCUBE_PARSE_WORKERS", str(os.cpu_count() or 1))
+)
+# Bump when the content of the Parquet cache changes, so that previously cached
+# workbooks are parsed again
+SPENDCUBE_CACHE_VERSION = "2"
+# The only columns of the SpendCube workbooks used by the report
+SPENDCUBE_COLUMNS = [
+    "supplier_name",
+    "fiscal_year",
+    "spend_in_eur",
+    "segment_code_and_text",
+]
+# Workbooks being converted to Parquet, by Parquet path
+_conversions = SingleFlight()
+
+
+class CachedSpendCube:
+    """
+    SpendCube workbook stored on Azure Blob Storage, read through a local Parquet
+    cache keyed by blob name and ETag. The workbook is only parsed the first time
+    a given version of the blob is read, later reads are memory-mapped Parquet
+    reads of the columns asked for.
+    """
+
+    def __init__(self, blob_name, etag, data=None):
+        """
+        Initializes a CachedSpendCube object.
+
+        Args:
+        - blob_name (str): The name of the blob.
+        - etag (str): The ETag of the blob.
+        - data (io.BytesIO, optional): The downloaded workbook, needed when it is
+        not cached yet.
+        """
+        self.name = blob_name
+        self.etag = etag
+        self.data = data
+
+    @property
+    def _cache_key(self):
+        return hash_text(
+            "\n".join([SPENDCUBE_CACHE_VERSION, self.name, self.etag])
+        )
+
+    @property
+    def parquet_path(self):
+        return os.path.join(get_cache_dir("spendcube"), self._cache_key + ".parquet")
+
+    @property
+    def supplier_index_path(self):
+        return os.path.join(
+            get_cache_dir("spendcube"), self._cache_key + ".suppliers.npz"
+        )
+
+    def is_cached(self):
+        return os.path.exists(self.parquet_path)
+
+    def read(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Reads the workbook, from the Parquet cache when possible. A workbook read
+        by several threads at once is parsed only once.
+
+        Args:
+        - columns (List[str], optional): The columns to read. Defaults to all the
+        columns of the workbook.
+
+        Returns:
+        - pd.DataFrame: The columns of the workbook.
+        """
+        if self.is_cached():
+            return self._read_parquet(columns)
+        data = _conversions.do(self.parquet_path, self._convert)
+        return data if columns is None else data[columns]
+
+    def read_supplier_index(self, data: pd.DataFrame) -> "SupplierIndex":
+        """
+        Reads the SupplierIndex saved along the Parquet cache, building and saving
+        it if missing (e.g. for a cache written by an older version).
+
+        Args:
+        - data (pd.DataFrame): The rows of the workbook, as returned by read.
+
+        Returns:
+        - SupplierIndex: The index of the supplier names of the rows.
+        """
+        if os.path.exists(self.supplier_index_path):
+            return SupplierIndex.load(self.supplier_index_path)
+        index = SupplierIndex.from_supplier_names(data["supplier_name"])
+        _write_atomically(self.supplier_index_path, index.save)
+        return index
+
+    def _read_parquet(self, columns=None):
+        return pd.read_parquet(self.parquet_path, columns=columns, memory_map=True)
+
+    def _convert(self):
+        if self.is_cached():
+            return self._read_parquet()
+        # All the columns are kept, the aggregated workbook exports them
+        data = _stringify_mixed_columns(pd.read_excel(self.data, engine="openpyxl"))
+        # The index is written first, so that a cached workbook always has one
+        index = SupplierIndex.from_supplier_names(data["supplier_name"])
+        _write_atomically(self.supplier_index_path, index.save)
+        _write_atomically(
+            self.parquet_path, lambda path: data.to_parquet(path, index=False)
+        )
+        return data
+
+
+def _stringify_mixed_columns(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converts to text the values of the columns mixing text and numbers, which
+    Parquet cannot store. Missing values are kept.
+
+    Args:
+    - data (pd.DataFrame): The rows of a workbook.
+
+    Returns:
+    - pd.DataFrame: The rows, with the mixed columns as text.
+    """
+    for column in data.columns[data.dtypes == object]:
+        values = data[column].dropna()
+        if values.map(type).nunique() > 1:
+            data.loc[values.index, column] = values.astype(str)
+    return data
+
+
+def _write_atomically(path, write: Callable[[str], None]):
+    """
+    Writes a cache file through a temporary file renamed once complete. Each
+    writer has its own temporary file, the last rename wins.
+
+    Args:
+    - path (str): The path to the file.
+    - write (Callable): Writes the content to the path it is given.
+    """
+    with tempfile.NamedTemporaryFile(
+        dir=os.path.dirname(path), suffix=".tmp", delete=False
+    ) as f:
+        tmp_path = f.name
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def load_spendcube_blob(container_client, blob_name) -> CachedSpendCube:
+    """
+    Gets a SpendCube workbook from Azure Blob Storage. The blob is only downloaded
+    if its current version is not in the Parquet cache.
+
+    Args:
+    - container_client (ContainerClient): The client of the blob container.
+    - blob_name (str): The name of the blob.
+
+    Returns:
+    - CachedSpendCube: The workbook, to be read with read_spendcube.
+
+    Raises:
+    - ResourceNotFoundError: If the blob does not exist.
+    """
+    etag = container_client.get_blob_client(blob_name).get_blob_properties().etag
+    source = CachedSpendCube(blob_name, etag)
+    if not source.is_cached():
+        buffer = io.BytesIO()
+        downloader = container_client.download_blob(blob_name, max_concurrency=4)
+        downloader.readinto(buffer)
+        buffer.seek(0)
+        # The blob may have changed since its properties were read
+        source = CachedSpendCube(blob_name, downloader.properties.etag, buffer)
+    return source
+
+
+def read_spendcube(source, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Reads a SpendCube workbook.
+
+    Args:
+    - source (str, io.BytesIO or CachedSpendCube): The path to the workbook, the
+    in-memory workbook or the cached Azure workbook.
+    - columns (List[str], optional): The columns to read, e.g. SPENDCUBE_COLUMNS
+    for the report. Defaults to all the columns.
+
+    Returns:
+    - pd.DataFrame: The rows of the workbook.
+    """
+    if isinstance(source, CachedSpendCube):
+        return source.read(columns)
+    return pd.read_excel(source, engine="openpyxl", usecols=columns)
+
+
+def normalize_supplier_name(name):
+    """
+    Normalizes a supplier name for matching: lower case, single spaces.
+
+    Args:
+    - name (str): The supplier name.
+
+    Returns:
+    - str: The normalized name.
+    """
+    return " ".join(str(name).lower().split())
+
+
+class SupplierIndex:
+    """
+    Index of the distinct supplier names of a SpendCube table.
+
+    Each row is mapped once to the code of its supplier name (as in a pandas
+    categorical), so that name lookups only touch the distinct names and rows
+    are then selected by code. The index of a cached workbook is built once and
+    saved next to its Parquet file.
+    """
+
+    def __init__(self, codes: np.ndarray, names: List[str]):
+        """
+        Initializes a SupplierIndex object.
+
+        Args:
+        - codes (np.ndarray): The code of the supplier name of each row, -1 for
+        a missing name.
+        - names (List[str]): The distinct supplier names, by code.
+        """
+        self.codes = codes
+        self.names = list(names)
+        self.normalized_names = [normalize_supplier_name(name) for name in self.names]
+
+    @classmethod
+    def from_supplier_names(cls, supplier_names: pd.Series):
+        """
+        Builds the index of a SpendCube table.
+
+        Args:
+        - supplier_names (pd.Series): The supplier name of each row.
+
+        Returns:
+        - SupplierIndex: The index.
+        """
+        codes, names = pd.factorize(supplier_names)
+        return cls(codes, names.astype(str))
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads an index saved with save.
+
+        Args:
+        - path (str): The path to the index file.
+
+        Returns:
+        - SupplierIndex: The index.
+        """
+        with np.load(path) as arrays:
+            return cls(arrays["codes"], arrays["names"].tolist())
+
+    def save(self, path):
+        """
+        Saves the index, to be loaded with load.
+
+        Args:
+        - path (str): The path to the index file.
+        """
+        with open(path, "wb") as f:
+            np.savez_compressed(f, codes=self.codes, names=np.array(self.names))
+
+    def find(self, company_name) -> List[str]:
+        """
+        Finds the supplier names containing the company name as whole words.
+
+        Args:
+        - company_name (str): The name of the company, case insensitive.
+
+        Returns:
+        - List[str]: The matching supplier names.
+        """
+        pattern = re.compile(rf"\b{re.escape(normalize_supplier_name(company_name))}\b")
+        return [
+            name
+            for name, normalized_name in zip(self.names, self.normalized_names)
+            if pattern.search(normalized_name)
+        ]
+
+    def suggest(self, company_name, limit=10, score_cutoff=85) -> List[str]:
+        """
+        Finds the supplier names close to the company name, e.g. misspelled.
+
+        Args:
+        - company_name (str): The name of the company.
+        - limit (int): The maximum number of suggestions.
+        - score_cutoff (float): The minimum similarity score, between 0 and 100.
+
+        Returns:
+        - List[str]: The closest supplier names, best first.
+        """
+        matches = process.extract(
+            normalize_supplier_name(company_name),
+            self.normalized_names,
+            scorer=fuzz.WRatio,
+            limit=limit,
+            score_cutoff=score_cutoff,
+        )
+        return [self.names[index] for _, _, index in matches]
+
+    def mask(self, names) -> np.ndarray:
+        """
+        Selects the rows of the given suppliers.
+
+        Args:
+        - names (List[str]): The supplier names, case insensitive.
+
+        Returns:
+        - np.ndarray: The boolean mask of the selected rows.
+        """
+        wanted = {normalize_supplier_name(name) for name in names}
+        selected_codes = [
+            code
+            for code, normalized_name in enumerate(self.normalized_names)
+            if normalized_name in wanted
+        ]
+        return np.isin(self.codes, selected_codes)
+
+
+def _read_with_supplier_index(source):
+    data = read_spendcube(source)
+    if isinstance(source, CachedSpendCube):
+        return data, source.read_supplier_index(data)
+    return data, SupplierIndex.from_supplier_names(data["supplier_name"])
+
+
+def filter_by_company_name(source, company_name):
+    """
+    Reads a SpendCube workbook and keeps the rows whose supplier name contains
+    the company name as whole words.
+
+    Args:
+    - source (str, io.BytesIO or CachedSpendCube): The workbook, see read_spendcube.
+    - company_name (str): The name of the company.
+
+    Returns:
+    - Tuple[pd.DataFrame, List[str]]: The filtered rows and the supplier names
+    close to the company name that were not selected.
+    """
+    data, index = _read_with_supplier_index(source)
+    supplier_names = index.find(company_name)
+    suggestions = [
+        name for name in index.suggest(company_name) if name not in supplier_names
+    ]
+    return data[index.mask(supplier_names)], suggestions
+
+
+def filter_by_entities(source, list_of_entities) -> pd.DataFrame:
+    """
+    Reads a SpendCube workbook and keeps the rows of the given suppliers.
+
+    Args:
+    - source (str, io.BytesIO or CachedSpendCube): The workbook, see read_spendcube.
+    - list_of_entities (List[str]): The supplier names, case insensitive.
+
+    Returns:
+    - pd.DataFrame: The filtered rows.
+    """
+    data, index = _read_with_supplier_index(source)
+    return data[index.mask(list_of_entities)]
+
+
+def _apply(function, args, source):
+    return function(source, *args)
+
+
+def map_spendcube_files(function: Callable, sources: List, *args) -> List:
+    """
+    Applies a parsing function to several SpendCube workbooks in the shared
+    process pool, one workbook per task.
+
+    Args:
+    - function (Callable): A module-level function taking a workbook and *args.
+    - sources (List[str, io.BytesIO or CachedSpendCube]): The workbooks,
+    see read_spendcube.
+    - *args: The extra arguments of the function.
+
+    Returns:
+    - List: The results of the function, in the order of sources.
+    """
+    task = functools.partial(_apply, function, args)
+    if len(sources) <= 1:
+        return [task(source) for source in sources]
+    pool = get_process_pool("spendcube", SPENDCUBE_PARSE_WORKERS)
+    try:
+        return list(pool.map(task, sources))
+    except BrokenProcessPool:
+        discard_process_pool("spendcube")
+        raise
+
+
+def concat_frames(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Concatenates the tables of several workbooks at once.
+
+    Args:
+    - frames (List[pd.DataFrame]): The tables.
+
+    Returns:
+    - pd.DataFrame: The concatenated table.
+    """
+    if not frames:
+        return pd.DataFrame(columns=SPENDCUBE_COLUMNS)
+    return pd.concat(frames)
+
+
+class SpendRollup:
+    """
+    Spend sums per (supplier, segment, fiscal year), built incrementally from raw
+    SpendCube rows. The report sections only need these sums, so the raw rows can
+    be dropped once they are added.
+    """
+
+    KEYS = ["supplier_name", "segment_code_and_text", "fiscal_year"]
+
+    def __init__(self):
+        self.table = None
+
+    @classmethod
+    def from_frame(cls, data: pd.DataFrame):
+        """
+        Builds a rollup from raw SpendCube rows.
+
+        Args:
+        - data (pd.DataFrame): The raw rows.
+
+        Returns:
+        - SpendRollup: The rollup.
+        """
+        rollup = cls()
+        rollup.add(data)
+        return rollup
+
+    def _aggregate(self, data: pd.DataFrame) -> pd.DataFrame:
+        # dropna=False keeps the spend of rows with a missing supplier or segment
+        # in the yearly totals, as when they are computed from the raw rows
+        return (
+            data.groupby(self.KEYS, dropna=False)["spend_in_eur"].sum().reset_index()
+        )
+
+    def add(self, data: pd.DataFrame):
+        """
+        Adds raw SpendCube rows to the rollup.
+
+        Args:
+        - data (pd.DataFrame): The raw rows.
+        """
+        aggregated = self._aggregate(data)
+        if self.table is None:
+            self.table = aggregated
+        else:
+            self.table = self._aggregate(pd.concat([self.table, aggregated]))
+
+    def spend_by_year(self) -> pd.Series:
+        """
+        Returns the total spend of each fiscal year.
+
+        Returns:
+        - pd.Series: The spend in euros, indexed by fiscal year.
+        """
+        return self.table.groupby("fiscal_year")["spend_in_eur"].sum()
+
+    def pivot(self, entity) -> pd.DataFrame:
+        """
+        Returns the spend of each supplier or segment per fiscal year.
+
+        Args:
+        - entity (str): "supplier_name" or "segment_code_and_text".
+
+        Returns:
+        - pd.DataFrame: The spend in euros, indexed by entity with one column per
+        fiscal year.
+        """
+        return self.table.pivot_table(
+            index=entity,
+            columns="fiscal_year",
+            values="spend_in_eur",
+            aggfunc="sum",
+        )
@@ -1,7 +1,36 @@
+import json
+import tempfile
+import threading
 import unittest
+from unittest import mock
+import numpy as np
+import pandas as pd
+from langchain.chat_models import AzureChatOpenAI
+from langchain.embeddings.base import Embeddings
+from langchain.schema import ChatGeneration, Document
+from langchain.schema.messages import AIMessage
+from langchain.vectorstores import FAISS
+from src.document_loaders.configured_retriever import (
+    ConfiguredRetriever,
+    RetrievalConfig,
+)
+from src.document_loaders.abstract_loader import AbstractLoader
+from src.document_loaders.factiva_splitter import FactivaSectionSplitter
 from src.document_loaders.serp_loader import SerpLoader
 from src.questions.abstract_question import QuestionWithLLM
+from src.questions.financials.factiva_table_parser import parse_factiva_table
+from src.questions.financials.key_financials import evaluate_alerts, render_alerts
+from src.questions.people.board_question import BoardMembersQuestion
+from src.questions.question_batch import QuestionBatch, _parse_json_object
 from src.document_loaders.pdf_loader import PdfLoader
+from src.utils.batch_utils import read_manifest
+from src.utils.cache_utils import DiskCache
+from src.utils.concurrency_utils import SingleFlight
+from src.utils.embedding_utils import EmbeddingCache
+from src.utils.fetch_utils import normalize_url
+from src.utils.llm_cache import DiskLLMCache
+from src.utils.rate_limit_utils import TokenBucket
+from src.utils.spendcube_utils import SpendRollup
 
 
 class TestReportGeneration(unittest.TestCase):
@@ -67,5 +96,529 @@ class TestReportGeneration(unittest.TestCase):
         self.assertGreaterEqual(len(self.question_with_no_answer_in_factiva.sources), 1)
 
 
+def _llm_string(temperature):
+    llm = AzureChatOpenAI(
+        model_name="gpt-4",
+        openai_api_base="https://example.invalid",
+        openai_api_version="2023-05-15",
+        deployment_name="deployment",
+        openai_api_key="key",
+        openai_api_type="azure",
+        temperature=temperature,
+    )
+    return llm._get_llm_string(stop=None)
+
+
+class TestDiskLLMCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        with mock.patch("src.utils.cache_utils.CACHE_DIR", self.directory.name):
+            self.cache = DiskLLMCache()
+        self.generations = [ChatGeneration(message=AIMessage(content="1979"))]
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_round_trip_deterministic_call(self):
+        llm_string = _llm_string(temperature=0)
+        self.assertIsNone(self.cache.lookup("prompt", llm_string))
+        self.cache.update("prompt", llm_string, self.generations)
+        cached = self.cache.lookup("prompt", llm_string)
+        self.assertEqual(cached[0].message.content, "1979")
+
+    def test_non_deterministic_call_not_cached(self):
+        llm_string = _llm_string(temperature=0.7)
+        self.cache.update("prompt", llm_string, self.generations)
+        self.assertIsNone(self.cache.lookup("prompt", llm_string))
+
+
+class TestEmbeddingCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_get_put(self):
+        cache = EmbeddingCache(self.directory.name, max_entries=4)
+        self.assertEqual(cache.get_many(["a"]), {})
+        cache.put_many({"a": [1.0, 2.0], "b": [3.0, 4.0]})
+        self.assertEqual(
+            cache.get_many(["a", "b", "c"]), {"a": [1.0, 2.0], "b": [3.0, 4.0]}
+        )
+        cache.put_many({"a": [5.0, 6.0]})
+        self.assertEqual(cache.get_many(["a"]), {"a": [5.0, 6.0]})
+
+    def test_least_recently_used_evicted(self):
+        cache = EmbeddingCache(self.directory.name, max_entries=2)
+        cache.put_many({"a": [1.0], "b": [2.0]})
+        cache.get_many(["a"])
+        cache.put_many({"c": [3.0]})
+        self.assertEqual(cache.get_many(["a", "b", "c"]), {"a": [1.0], "c": [3.0]})
+
+    def test_reopen(self):
+        cache = EmbeddingCache(self.directory.name, max_entries=2)
+        cache.put_many({"a": [1.0], "b": [2.0]})
+        cache.put_many({"c": [3.0]})
+        reopened = EmbeddingCache(self.directory.name, max_entries=2)
+        self.assertEqual(reopened.get_many(["a", "b", "c"]), {"b": [2.0], "c": [3.0]})
+
+    def test_shared_directory(self):
+        first = EmbeddingCache(self.directory.name, max_entries=4)
+        second = EmbeddingCache(self.directory.name, max_entries=4)
+        first.put_many({"a": [1.0]})
+        second.put_many({"b": [2.0]})
+        self.assertEqual(first.get_many(["a", "b"]), {"a": [1.0], "b": [2.0]})
+        self.assertEqual(second.get_many(["a", "b"]), {"a": [1.0], "b": [2.0]})
+
+    def test_compaction(self):
+        cache = EmbeddingCache(self.directory.name, max_entries=2)
+        for value in range(2500):
+            cache.put_many({"a": [float(value)]})
+        with open(f"{self.directory.name}/index.log") as f:
+            self.assertLess(len(f.readlines()), 2500)
+        reopened = EmbeddingCache(self.directory.name, max_entries=2)
+        self.assertEqual(reopened.get_many(["a"]), {"a": [2499.0]})
+
+
+class TestQuestionBatch(unittest.TestCase):
+    def setUp(self) -> None:
+        loader = mock.Mock()
+        loader.get_retriever.return_value.get_relevant_documents.return_value = []
+        self.question = QuestionWithLLM("Founded", "When?", loader, "gpt4")
+        self.board = BoardMembersQuestion("Gartner", loader, backup_loaders=[])
+        self.batch = QuestionBatch([self.question, self.board])
+
+    def _reply(self, reply):
+        llm = mock.Mock()
+        llm.predict.return_value = reply
+        return mock.patch.object(QuestionWithLLM, "_select_llm", return_value=llm)
+
+    def test_answers_parsed(self):
+        reply = (
+            '{"1": {"answer": "1979", "sources": ["report.pdf"]}, '
+            '"2": {"answer": {"Name": ["Gene Hall"]}, "sources": "report.pdf"}}'
+        )
+        with self._reply(reply):
+            answer = self.batch.get_answer(self.question)
+        self.assertEqual(json.loads(answer)["answer"], "1979")
+        self.assertEqual(json.loads(answer)["sources"], "report.pdf")
+        board_answer = json.loads(self.batch.get_answer(self.board))["answer"]
+        self.assertEqual(json.loads(board_answer), {"Name": ["Gene Hall"]})
+
+    def test_unparsable_answer_asked_again(self):
+        reply = (
+            '{"1": {"answer": "1979", "sources": "report.pdf"}, '
+            '"2": {"answer": "Gene Hall, CEO", "sources": "report.pdf"}}'
+        )
+        with self._reply(reply):
+            self.assertIsNotNone(self.batch.get_answer(self.question))
+        self.assertIsNone(self.batch.get_answer(self.board))
+
+
+class _FixedEmbeddings(Embeddings):
+    # Embeds the texts as the vectors given for them
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def embed_documents(self, texts):
+        return [self.vectors[text] for text in texts]
+
+    def embed_query(self, text):
+        return self.vectors[text]
+
+
+class TestConfiguredRetriever(unittest.TestCase):
+    def setUp(self) -> None:
+        vectors = {
+            "Net income 10": [1.0, 0.0],
+            "Revenue 20": [0.9, 0.1],
+            "Board: Gene Hall": [0.0, 1.0],
+            "income?": [1.0, 0.05],
+        }
+        sections = ["Key Financials", "Key Financials", "Board of Directors"]
+        texts = list(vectors)[:3]
+        embeddings = _FixedEmbeddings(vectors)
+        self.index = FAISS.from_embeddings(
+            [(text, vectors[text]) for text in texts],
+            embeddings,
+            metadatas=[{"section": section} for section in sections],
+        )
+
+    def _retrieve(self, **config):
+        retriever = ConfiguredRetriever(
+            vectorstore=self.index, config=RetrievalConfig(**config)
+        )
+        return [d.page_content for d in retriever.get_relevant_documents("income?")]
+
+    def test_most_similar_first(self):
+        self.assertEqual(self._retrieve(k=2), ["Net income 10", "Revenue 20"])
+
+    def test_sections(self):
+        self.assertEqual(
+            self._retrieve(sections=["Board of Directors"]), ["Board: Gene Hall"]
+        )
+
+    def test_unknown_section_searches_whole_index(self):
+        self.assertEqual(self._retrieve(sections=["Locations"], k=1), ["Net income 10"])
+
+    def test_mmr_prefers_diverse_splits(self):
+        self.assertEqual(
+            self._retrieve(k=2, mmr=True, lambda_mult=0.1),
+            ["Net income 10", "Board: Gene Hall"],
+        )
+
+    def test_score_threshold(self):
+        self.assertEqual(
+            self._retrieve(score_threshold=0.9), ["Net income 10", "Revenue 20"]
+        )
+
+    @mock.patch(
+        "src.document_loaders.configured_retriever.estimate_tokens",
+        lambda text: len(text.split()),
+    )
+    def test_max_tokens(self):
+        self.assertEqual(self._retrieve(max_tokens=4), ["Net income 10"])
+        self.assertEqual(self._retrieve(max_tokens=1), ["Net income 10"])
+        self.assertEqual(len(self._retrieve(max_tokens=5)), 2)
+
+    def test_loader_without_sections_applies_k_and_mmr(self):
+        loader = mock.Mock(spec=SerpLoader, sectioned=False)
+        loader.get_index.return_value = self.index
+        config = RetrievalConfig(
+            sections=["Board of Directors"], k=2, mmr=True, lambda_mult=0.1
+        )
+        retriever = AbstractLoader.get_retriever(loader, config)
+        documents = retriever.get_relevant_documents("income?")
+        self.assertEqual(
+            [document.page_content for document in documents],
+            ["Net income 10", "Board: Gene Hall"],
+        )
+        self.assertEqual(config.sections, ["Board of Directors"])
+
+
+class TestReadManifest(unittest.TestCase):
+    def test_short_and_empty_rows(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = f"{directory}/manifest.csv"
+            with open(path, "w") as f:
+                f.write("company,factiva_pdf,spend_file\n")
+                f.write(" Gartner ,gartner.pdf,spend.xlsx\n")
+                f.write(",other.pdf,spend.xlsx\n")
+                f.write("Acme\n")
+            rows = read_manifest(path)
+        self.assertEqual([row["company"] for row in rows], ["Gartner", "Acme"])
+        self.assertEqual(rows[0]["factiva_pdf"], f"{directory}/gartner.pdf")
+        self.assertEqual(rows[1]["spend_file"], "")
+
+    def test_duplicate_and_unsafe_company_names(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = f"{directory}/manifest.csv"
+            with open(path, "w") as f:
+                f.write("company,factiva_pdf,spend_file\n")
+                for company in ["Gartner", "GARTNER", "A/B", "A:B", "..", "../x"]:
+                    f.write(f"{company},report.pdf,spend.xlsx\n")
+            rows = read_manifest(path)
+        self.assertEqual(
+            [row["report_name"] for row in rows],
+            ["Gartner.html", "A_B.html", "A_B (2).html", "report.html", "_x.html"],
+        )
+
+
+BALANCE_SHEET_REPORT = """
+Table of Contents
+Annual Balance Sheet ................ 12
+Annual Income Statement ............. 13
+Page 1 of 20
+
+Annual Balance Sheet
+Fiscal Year Ending      12/31/2022    12/31/2021
+All figures in Millions of U.S. Dollar
+Total Assets            3,321.76      (2.7)
+Total Shareholders' Equity   1,000     -900.5
+Annual Income Statement
+Fiscal Year Ending      12/31/2022    12/31/2021
+"""
+
+
+class TestParseFactivaTable(unittest.TestCase):
+    def test_table_after_table_of_contents(self):
+        table = parse_factiva_table(
+            BALANCE_SHEET_REPORT,
+            "Annual Balance Sheet",
+            ["Total Assets", "Total Shareholders Equity"],
+        )
+        self.assertEqual(
+            table,
+            {
+                "Year": [2022, 2021],
+                "Total Assets": ["3,321.76", "(2.7)"],
+                "Total Shareholders Equity": ["1,000", "-900.5"],
+                "Unit": "million USD",
+            },
+        )
+
+    def test_value_count_mismatch(self):
+        text = BALANCE_SHEET_REPORT.replace("3,321.76      (2.7)", "3,321.76")
+        self.assertIsNone(
+            parse_factiva_table(text, "Annual Balance Sheet", ["Total Assets"])
+        )
+
+    def test_missing_figure(self):
+        self.assertIsNone(
+            parse_factiva_table(
+                BALANCE_SHEET_REPORT, "Annual Balance Sheet", ["Net Income"]
+            )
+        )
+
+    def test_missing_table(self):
+        self.assertIsNone(
+            parse_factiva_table(
+                BALANCE_SHEET_REPORT, "Annual Cash Flow", ["Total Assets"]
+            )
+        )
+
+
+class TestSingleFlight(unittest.TestCase):
+    def test_concurrent_calls_run_once(self):
+        flight = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        calls, results = [], []
+
+        def fn():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return "value"
+
+        leader = threading.Thread(target=lambda: results.append(flight.do("k", fn)))
+        leader.start()
+        started.wait(5)
+        followers = [
+            threading.Thread(target=lambda: results.append(flight.do("k", fn)))
+            for _ in range(3)
+        ]
+        for follower in followers:
+            follower.start()
+        release.set()
+        for thread in [leader] + followers:
+            thread.join(5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["value"] * 4)
+        # The key is released once the call is over
+        self.assertEqual(flight.do("k", lambda: "again"), "again")
+
+    def test_exception_raised_and_key_released(self):
+        flight = SingleFlight()
+        with self.assertRaises(ZeroDivisionError):
+            flight.do("k", lambda: 1 / 0)
+        self.assertEqual(flight.do("k", lambda: 1), 1)
+
+
+class TestDiskCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        patcher = mock.patch("src.utils.cache_utils.CACHE_DIR", self.directory.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.directory.cleanup)
+
+    def test_get_set(self):
+        cache = DiskCache("test")
+        self.assertIsNone(cache.get("a"))
+        cache.set("a", {"value": [1, 2]})
+        self.assertEqual(cache.get("a"), {"value": [1, 2]})
+        self.assertEqual(DiskCache("test").get("a"), {"value": [1, 2]})
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_expiry(self):
+        cache = DiskCache("test", ttl=60)
+        with mock.patch("src.utils.cache_utils.time.time", return_value=1000):
+            cache.set("a", 1)
+        with mock.patch("src.utils.cache_utils.time.time", return_value=1030):
+            self.assertEqual(cache.get("a"), 1)
+        with mock.patch("src.utils.cache_utils.time.time", return_value=1061):
+            self.assertIsNone(cache.get("a"))
+
+    def test_least_recently_used_evicted(self):
+        cache = DiskCache("test")
+        cache.set("a", "x" * 100)
+        entry_size = cache.stats()["bytes"]
+        cache.max_bytes = 2 * entry_size
+        cache.set("b", "x" * 100)
+        cache.get("a")
+        cache.set("c", "x" * 100)
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNotNone(cache.get("c"))
+
+
+class TestNormalizeUrl(unittest.TestCase):
+    def test_spellings_of_the_same_page(self):
+        self.assertEqual(
+            normalize_url(" HTTPS://Example.COM/News/?utm_source=x&b=2&a=1#top "),
+            "https://example.com/News?a=1&b=2",
+        )
+        self.assertEqual(
+            normalize_url("https://example.com/News"),
+            normalize_url("https://EXAMPLE.com/News/"),
+        )
+
+    def test_path_and_query_values_kept(self):
+        self.assertNotEqual(
+            normalize_url("https://example.com/a?id=1"),
+            normalize_url("https://example.com/A?id=2"),
+        )
+
+
+class TestSpendRollup(unittest.TestCase):
+    def setUp(self) -> None:
+        self.rows = pd.DataFrame(
+            {
+                "supplier_name": ["Gartner", "Gartner", "Acme", None],
+                "fiscal_year": [2021, 2021, 2022, 2022],
+                "spend_in_eur": [10.0, 5.0, 7.0, 3.0],
+                "segment_code_and_text": ["IT", "IT", "IT", "HR"],
+            }
+        )
+
+    def test_spend_by_year_keeps_rows_without_supplier(self):
+        rollup = SpendRollup.from_frame(self.rows)
+        self.assertEqual(rollup.spend_by_year().to_dict(), {2021: 15.0, 2022: 10.0})
+
+    def test_add(self):
+        rollup = SpendRollup.from_frame(self.rows.iloc[:2])
+        rollup.add(self.rows.iloc[2:])
+        rollup.add(self.rows.iloc[:1])
+        self.assertEqual(rollup.spend_by_year().to_dict(), {2021: 25.0, 2022: 10.0})
+        self.assertEqual(len(rollup.table), 3)
+
+    def test_pivot(self):
+        pivot = SpendRollup.from_frame(self.rows).pivot("supplier_name")
+        self.assertEqual(pivot.loc["Gartner", 2021], 15.0)
+        self.assertEqual(pivot.loc["Acme", 2022], 7.0)
+        self.assertTrue(np.isnan(pivot.loc["Acme", 2021]))
+
+
+class TestAlerts(unittest.TestCase):
+    def setUp(self) -> None:
+        self.table = pd.DataFrame(
+            {"Net Income": [10.0, 5.0, 1.0], "Current Ratio": [3.0, 1.5, 2.0]},
+            index=pd.Index([2020, 2021, 2023], name="Year"),
+        )
+        self.config = {
+            "decreasing_alert": {"column_names": ["Net Income"]},
+            "ratio_lower_than_value_alerts": [
+                {"column_names": ["Current Ratio"], "threshold": 2}
+            ],
+        }
+
+    def test_evaluate_alerts(self):
+        alerts = evaluate_alerts(self.table, self.config)
+        # 2023 is not compared to 2021, as 2022 is missing
+        self.assertEqual(alerts["Net Income"].notna().tolist(), [False, True, False])
+        self.assertEqual(alerts["Current Ratio"].notna().tolist(), [False, True, False])
+        self.assertIn("lower than 2", alerts.loc[2021, "Current Ratio"])
+
+    def test_render_alerts(self):
+        rendered = render_alerts(self.table, evaluate_alerts(self.table, self.config))
+        self.assertTrue(rendered.loc[2021, "Net Income"].startswith("<span"))
+        self.assertEqual(rendered.loc[2020, "Net Income"], 10.0)
+
+
+class TestFactivaSectionSplitter(unittest.TestCase):
+    def test_chunks_by_section(self):
+        pages = [
+            Document(
+                page_content="Gartner Inc\nCompany Overview\nGartner is a research "
+                "company.\nPage 1 of 2",
+                metadata={"page": 0},
+            ),
+            Document(
+                page_content="KEY EXECUTIVES:\nGene Hall, CEO\n© 2023 Factiva, Inc.",
+                metadata={"page": 1},
+            ),
+        ]
+        chunks = FactivaSectionSplitter().split_documents(pages)
+        self.assertEqual(
+            [(chunk.metadata["section"], chunk.metadata["page"]) for chunk in chunks],
+            [("Other", 0), ("Company Overview", 0), ("Key Executives", 1)],
+        )
+        self.assertNotIn("Page 1 of 2", chunks[1].page_content)
+        self.assertNotIn("Factiva", chunks[2].page_content)
+
+    def test_table_of_contents_headings_skipped(self):
+        pages = [
+            Document(
+                page_content="Company Overview\nManagement Team\n"
+                "Annual Balance Sheet\n\nCompany Overview\nGartner is a research "
+                "company.",
+                metadata={"page": 0},
+            )
+        ]
+        chunks = FactivaSectionSplitter().split_documents(pages)
+        self.assertEqual(len(chunks), 1)
+        self.assertEqual(chunks[0].metadata["section"], "Company Overview")
+        self.assertIn("research company", chunks[0].page_content)
+
+    def test_long_section_chunks_repeat_heading(self):
+        text = "Board of Directors\n" + "\n".join(
+            f"Director {number}, Independent Director" for number in range(20)
+        )
+        pages = [Document(page_content=text, metadata={"page": 3})]
+        splitter = FactivaSectionSplitter(chunk_size=200, chunk_overlap=0)
+        chunks = splitter.split_documents(pages)
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertEqual(chunk.metadata["section"], "Board of Directors")
+            self.assertTrue(chunk.page_content.startswith("Board of Directors\n"))
+            self.assertLessEqual(len(chunk.page_content), 220)
+
+
+class TestTokenBucket(unittest.TestCase):
+    def setUp(self) -> None:
+        patcher = mock.patch("src.utils.rate_limit_utils.time.monotonic")
+        self.monotonic = patcher.start()
+        self.monotonic.return_value = 0.0
+        self.addCleanup(patcher.stop)
+
+    def test_reserve_and_refill(self):
+        bucket = TokenBucket(per_minute=60)
+        self.assertEqual(bucket.reserve(60), 0.0)
+        self.assertEqual(bucket.reserve(30), 30.0)
+        self.monotonic.return_value = 10.0
+        self.assertEqual(bucket.available(), -20.0)
+        self.monotonic.return_value = 1000.0
+        self.assertEqual(bucket.available(), 60.0)
+
+    def test_give_back(self):
+        bucket = TokenBucket(per_minute=60)
+        bucket.reserve(50)
+        bucket.give_back(20)
+        self.assertEqual(bucket.available(), 30.0)
+        bucket.give_back(100)
+        self.assertEqual(bucket.available(), 60.0)
+
+    def test_amount_capped_to_capacity(self):
+        self.assertEqual(TokenBucket(per_minute=60).reserve(600), 0.0)
+
+    def test_disabled(self):
+        bucket = TokenBucket(per_minute=0)
+        self.assertEqual(bucket.reserve(1000), 0.0)
+
+
+class TestParseJsonObject(unittest.TestCase):
+    def test_object_in_code_fence(self):
+        reply = 'Here are the answers:\n```json\n{"1": {"answer": "1979"}}\n```'
+        self.assertEqual(_parse_json_object(reply), {"1": {"answer": "1979"}})
+
+    def test_no_object(self):
+        with self.assertRaises(ValueError):
+            _parse_json_object("I don't know")
+        with self.assertRaises(ValueError):
+            _parse_json_object("{not json}")
+
+
 if __name__ == "__main__":
     unittest.main()